@@ -1,41 +1,33 @@
 #!/usr/bin/env python
 import sys
-import os
 import xmltodict
-import json
+from poker.ledger import Ledger
 
 """Collect statistics about player money.
 
 At this point, it only collects the sum of money each player won/lost. It reads
-the json file `STATS_FILE` (or creates a new one), reads the resulting state of
-the poker game from stdin. It assumes stdin is the xml output from running:
+the resulting state of the poker game from stdin and adds the difference
+between `stack` and `in_stack` of every player to the results ledger
+`STATS_FILE` (see poker/ledger.py), then prints the totals. It assumes stdin is
+the xml output from running:
 
     $ python poker_platform.py play_hand | ./this_script.py
 
-It will add the difference between `stack` and `in_stack` into the resulting
-statistics. If the player doesn't have any statistic on the money he has, it
-will initialize it to 0 and then add the difference there.
+Several games may write to the same ledger at once. A new ledger starts from
+the totals in the `OLD_STATS_FILE` written by the earlier versions.
 """
 
-STATS_FILE = 'stats.json'
+STATS_FILE = 'stats.ledger'
+OLD_STATS_FILE = 'stats.json'
 
 
 def write_stats(players):
-    if os.path.isfile(STATS_FILE):
-        with open(STATS_FILE, 'r') as f:
-            stats = json.load(f)
-    else:
-        stats = dict()
-
-    for player in players:
-        diff = int(player['@stack']) - int(player['@in_stack'])
-        name = player['@name']
-        original = stats.get(name, 0)
-        stats[name] = original + diff
-    print stats
-
-    with open(STATS_FILE, 'w') as f:
-        json.dump(stats, f)
+    ledger = Ledger(STATS_FILE)
+    ledger.import_totals(OLD_STATS_FILE)
+    ledger.add(dict((player['@name'],
+                     int(player['@stack']) - int(player['@in_stack']))
+                    for player in players))
+    print ledger.totals()
 
 
 def main():
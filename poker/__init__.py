@@ -1,4 +1,15 @@
-from bot import get_bot
-import logs
+"""Poker bot for robopoker.
 
-__all__ = [get_bot, logs]
+Nothing heavy is imported with the package, the modules are loaded when
+they are used, so that bots started for every action (poker.cli) start
+fast.
+"""
+
+__all__ = ['get_bot']
+
+
+def get_bot(name, hole, possible_actions, state, deadline=None,
+            sessions=None):
+    """Return the bot based on its name, see `poker.bot.get_bot`"""
+    from poker.bot import get_bot
+    return get_bot(name, hole, possible_actions, state, deadline, sessions)
@@ -0,0 +1,248 @@
+"""Report statistics of the players or the bots over a hand archive.
+
+Every chunk of the `robopoker.archive` is summed up by numpy operations
+over its memory-mapped columns, the chunks are processed in parallel and
+their sums merged. Usage:
+
+    $ python -m poker.analytics [--by player|service] [-w WORKERS] ARCHIVE
+
+The report gives for every player (or service, i.e. bot strategy):
+
+    bb/100  big blinds won per 100 hands with its 95% confidence interval
+    VPIP    hands with money put in voluntarily preflop (call, bet, raise)
+    PFR     hands raised preflop
+    AF      aggression factor, postflop bets and raises per call
+    WSD     showdowns won
+
+and the won big blinds by position at the table and by the street where
+the player's hand ended (folded, or the last street dealt).
+"""
+import argparse
+import math
+import multiprocessing
+import time
+import numpy as np
+from robopoker import archive
+
+STREETS = ('preflop', 'flop', 'turn', 'river')
+# street of the board with this many cards
+BOARD_STREETS = np.array([0, 0, 0, 1, 2, 3])
+
+FOLD, CALL, BET, RAISE, ALLIN = [archive.ACTIONS.index(action) for action in
+                                 ('fold', 'call', 'bet', 'raise', 'allin')]
+COUNTERS = ('hands', 'won', 'won_sq', 'vpip', 'pfr', 'aggressive', 'calls',
+            'showdowns', 'showdown_wins')
+
+
+def position_labels(seat_count):
+    """Return the names of the positions at a table of `seat_count` seats,
+    in the order of `seat.position`: the blinds, UTG, UTG+1, ... and the
+    button
+    """
+    if seat_count <= 2:
+        return ('SB', 'BB')[:seat_count]
+    return (('SB', 'BB') +
+            tuple('UTG+%d' % k if k else 'UTG' for k in range(seat_count - 3))
+            + ('BTN',))
+
+
+def position_order(label):
+    """Sort key of the position names of all table sizes"""
+    if label.startswith('UTG'):
+        return 2 + int(label[4:] or 0)
+    return {'SB': 0, 'BB': 1}.get(label, float('inf'))
+
+
+def run(path, by='player', workers=None):
+    """Return the statistics of all hands of the archive
+
+    :param by: 'player' or 'service'
+    :param workers: number of processes, all CPUs by default; with 1 the
+        chunks are processed in this process
+    :returns: dict of name -> statistics, see `chunk_stats`
+    """
+    tasks = [(chunk.path, by) for chunk in archive.chunks(path)]
+    if workers == 1 or len(tasks) < 2:
+        return merge(map(chunk_stats, tasks))
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(chunk_stats, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return merge(results)
+
+
+def chunk_stats(args):
+    """Return the statistics of one chunk
+
+    :param args: tuple (chunk path, 'player' or 'service')
+    :returns: dict of name -> dict with `COUNTERS` (won in big blinds) and
+        'positions' and 'streets', dicts of position or street name ->
+        [hands, won, won_sq]
+    """
+    path, by = args
+    chunk = archive.Chunk(path)
+    names = chunk.players if by == 'player' else chunk.services
+    group = np.asarray(chunk['seat.' + by])
+    hand = np.asarray(chunk['seat.hand'])
+    seats = len(group)
+
+    big_blind = np.asarray(chunk['hand.big_blind'])[hand].astype(float)
+    won = (np.asarray(chunk['seat.stack']) -
+           np.asarray(chunk['seat.in_stack'])) / big_blind
+
+    act_seat = np.asarray(chunk['action.seat'])
+    act_street = np.asarray(chunk['action.street'])
+    act_type = np.asarray(chunk['action.type'])
+    raised = np.in1d(act_type, (BET, RAISE, ALLIN))
+    voluntary = raised | (act_type == CALL)
+    preflop = act_street == 0
+    vpip = np.zeros(seats, bool)
+    vpip[act_seat[preflop & voluntary]] = True
+    pfr = np.zeros(seats, bool)
+    pfr[act_seat[preflop & raised]] = True
+    aggressive = np.bincount(act_seat[~preflop & raised], minlength=seats)
+    calls = np.bincount(act_seat[~preflop & (act_type == CALL)],
+                        minlength=seats)
+
+    showdowns = np.asarray(chunk['seat.showdown'])
+    showdown_wins = showdowns & (np.asarray(chunk['seat.win']) > 0)
+
+    board = (np.asarray(chunk['hand.board']) >= 0).sum(axis=1)
+    streets = BOARD_STREETS[board][hand]
+    folds = act_type == FOLD
+    streets[act_seat[folds]] = act_street[folds]
+
+    count = np.asarray(chunk['hand.seat_count'])[hand]
+    # the labels of the largest table, the buttons of the smaller ones
+    # are moved to its button
+    position_names = position_labels(max(count.max() if seats else 0, 2))
+    positions = np.asarray(chunk['seat.position']).astype(int)
+    positions = np.where((positions == count - 1) & (count > 2),
+                         len(position_names) - 1, positions)
+
+    def total(weights, by_group=group, size=len(names)):
+        return np.bincount(by_group, weights=weights, minlength=size)
+
+    counters = [total(None), total(won), total(won * won), total(vpip),
+                total(pfr), total(aggressive), total(calls), total(showdowns),
+                total(showdown_wins)]
+    split = {}
+    for key, values, labels in (('positions', positions, position_names),
+                                ('streets', streets, STREETS)):
+        cell = group * len(labels) + values
+        size = len(names) * len(labels)
+        split[key] = [total(weights, cell, size).reshape(-1, len(labels))
+                      for weights in (None, won, won * won)]
+
+    stats = {}
+    for i, name in enumerate(names):
+        if not counters[0][i]:
+            continue
+        result = dict((counter, float(values[i]))
+                      for counter, values in zip(COUNTERS, counters))
+        for key, labels in (('positions', position_names),
+                            ('streets', STREETS)):
+            hands, won_sum, won_sq = split[key]
+            result[key] = dict(
+                (label, [float(hands[i, j]), float(won_sum[i, j]),
+                         float(won_sq[i, j])])
+                for j, label in enumerate(labels) if hands[i, j])
+        stats[name] = result
+    return stats
+
+
+def merge(results):
+    """Sum statistics of several chunks"""
+    merged = {}
+    for stats in results:
+        for name, result in stats.items():
+            total = merged.setdefault(
+                name, dict([(counter, 0.0) for counter in COUNTERS] +
+                           [('positions', {}), ('streets', {})]))
+            for counter in COUNTERS:
+                total[counter] += result[counter]
+            for key in ('positions', 'streets'):
+                for label, values in result[key].items():
+                    sums = total[key].setdefault(label, [0.0, 0.0, 0.0])
+                    for i, value in enumerate(values):
+                        sums[i] += value
+    return merged
+
+
+def bb_per_100(hands, won, won_sq):
+    """Return big blinds won per 100 hands and the half-width of its 95%
+    confidence interval
+
+    :param won: sum of big blinds won in the hands
+    :param won_sq: sum of squares of big blinds won in the hands
+    """
+    if not hands:
+        return 0.0, 0.0
+    mean = won / hands
+    variance = max(0.0, won_sq / hands - mean * mean)
+    return mean * 100, 1.96 * math.sqrt(variance / hands) * 100
+
+
+def ratio(part, whole):
+    return part / whole if whole else 0.0
+
+
+def report(stats):
+    """Return the statistics as a printable text"""
+    lines = ['%-20s %9s %18s %6s %6s %6s %6s' % (
+        'name', 'hands', 'bb/100', 'VPIP', 'PFR', 'AF', 'WSD')]
+    order = sorted(stats, key=lambda n: -stats[n]['won'])
+    for name in order:
+        result = stats[name]
+        rate, error = bb_per_100(result['hands'], result['won'],
+                                 result['won_sq'])
+        lines.append('%-20s %9d %8.2f +-%7.2f %5.1f%% %5.1f%% %6.2f %5.1f%%'
+                     % (name, result['hands'], rate, error,
+                        100 * ratio(result['vpip'], result['hands']),
+                        100 * ratio(result['pfr'], result['hands']),
+                        ratio(result['aggressive'], result['calls']),
+                        100 * ratio(result['showdown_wins'],
+                                    result['showdowns'])))
+    positions = sorted(set(label for result in stats.values()
+                           for label in result['positions']),
+                       key=position_order)
+    for key, labels in (('positions', positions), ('streets', STREETS)):
+        lines.append('')
+        lines.append('bb/100 by %s' % key[:-1])
+        lines.append('%-20s' % 'name' +
+                     ''.join(' %16s' % label for label in labels
+                             if any(label in stats[n][key] for n in order)))
+        for name in order:
+            cells = []
+            for label in labels:
+                if not any(label in stats[n][key] for n in order):
+                    continue
+                if label in stats[name][key]:
+                    cells.append(' %7.1f +-%6.1f' %
+                                 bb_per_100(*stats[name][key][label]))
+                else:
+                    cells.append(' %16s' % '-')
+            lines.append('%-20s' % name + ''.join(cells))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Report statistics of the hands in an archive')
+    parser.add_argument('archive')
+    parser.add_argument('--by', choices=('player', 'service'),
+                        default='player')
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    args = parser.parse_args()
+    start = time.time()
+    stats = run(args.archive, args.by, args.workers)
+    elapsed = time.time() - start
+    print report(stats)
+    hands = sum(result['hands'] for result in stats.values())
+    print '\n%d seats in %.1f s' % (hands, elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 import logging
-import math
+import time
 from poker.state import State
 from poker.random_choice import choice
 
@@ -28,6 +28,7 @@ class SimpleBot(object):
         cannot call, try to check; if we cannot check, fold).
 
         """
+        start = time.time()
         triplet = self.get_decision_probabilities()
         assert (sum(triplet) + 0.01) > 1.0
         decision = choice(['check', 'call', 'raise'], triplet)
@@ -52,6 +53,11 @@ class SimpleBot(object):
             decision = 'fold'
 
         LOG.info("Decision: %s", decision)
+        if self.state.deadline is not None:
+            budget = self.state.deadline - start
+            used = time.time() - start
+            LOG.info("Used %.3f s of the %.3f s budget (%.0f%%)", used,
+                     budget, 100 * used / budget if budget > 0 else 100)
         return decision
 
 
@@ -91,8 +97,7 @@ class SmartBot(SimpleBot):
         pot_odds = raise_needed/float(self.state.pot + raise_needed)
         reraise_pot_odds = ((BET_AMOUNT + raise_needed) /
                             float(self.state.pot + raise_needed + BET_AMOUNT))
-        hand_strength = math.pow(self.state.get_hand_strength(),
-                                 len(self.state.players) - 1)
+        hand_strength = self.state.get_equity()
         LOG.info("pot_odds: %f", pot_odds)
         LOG.info("hand_strength: %f", hand_strength)
         triplet = [1, 0, 0]
@@ -112,7 +117,7 @@ class RandomizedSmartBot(SmartBot):
     name = 'randomized-smart'
 
     def get_decision_probabilities(self):
-        triplet = super(self, RandomizedSmartBot).get_decision_probabilities()
+        triplet = super(RandomizedSmartBot, self).get_decision_probabilities()
         if triplet == [0, 0, 1]:
             triplet = [0.1, 0.2, 0.7]
         elif triplet == [0, 1, 0]:
@@ -149,27 +154,46 @@ class PassiveTightBot(PassiveLooseBot):
     PREFLOP_CALL_THRESHOLD = 0.6
 
 
-def get_bot(name, hole, possible_actions, state):
-    """Return the bot based on its name"""
-    parsed_state = State(name, hole, possible_actions, state)
-    bot = SmartBot(parsed_state)
-    if 'simple' == name:
-        bot = SimpleBot(parsed_state)
-    elif 'random' == name:
-        bot = RandomBot(parsed_state)
-    elif 'threshold' == name:
-        bot = ThresholdBot(parsed_state)
-    elif 'agressive-loose' == name:
-        bot = AgressiveLooseBot(parsed_state)
-    elif 'agressive-tight' == name:
-        bot = AgressiveTightBot(parsed_state)
-    elif 'passive-loose' == name:
-        bot = PassiveLooseBot(parsed_state)
-    elif 'passive-tight' == name:
-        bot = PassiveTightBot(parsed_state)
-    elif 'smart' == name:
-        bot = SmartBot(parsed_state)
-    elif 'randomized-smart' == name:
-        bot = RandomizedSmartBot(parsed_state)
+BOTS = {
+    'simple': SimpleBot,
+    'random': RandomBot,
+    'threshold': ThresholdBot,
+    'agressive-loose': AgressiveLooseBot,
+    'agressive-tight': AgressiveTightBot,
+    'passive-loose': PassiveLooseBot,
+    'passive-tight': PassiveTightBot,
+    'smart': SmartBot,
+    'randomized-smart': RandomizedSmartBot,
+}
+
+
+def get_bot_class(name):
+    """Return the strategy based on its name, SmartBot if it is unknown"""
+    return BOTS.get(name, SmartBot)
+
+
+def get_bot(name, hole, possible_actions, state, deadline=None,
+            sessions=None):
+    """Return the bot based on its name
+
+    The state is parsed only as far as the strategy looks at it.
+
+    :param deadline: time.time() by which the bot must decide, the
+        strategies that compute equity refine it until then
+    :param sessions: `poker.session.SessionCache` that keeps the hands
+        between their requests
+    """
+    bot_class = get_bot_class(name)
+    bot = bot_class(State(name, hole, possible_actions, state, deadline,
+                          sessions))
     LOG.info("\n\nname of the bot: %s", bot.name)
     return bot
+
+
+def decide(name, hole, possible_actions, state, deadline=None,
+           sessions=None):
+    """Return the decision of the bot, the entry point of robopoker's
+    python transport (service "poker.bot:decide")
+    """
+    return get_bot(name, hole, possible_actions, state, deadline,
+                   sessions).decide()
@@ -0,0 +1,62 @@
+"""Answer one request of robopoker's local transport and exit.
+
+The request is read from stdin and the decision written to stdout. Only
+the modules the chosen strategy needs are imported (numpy and the equity
+tables only by the strategies that compute equity), so it starts fast
+enough to be run for every action:
+
+    0 kari 200 local python -m poker.cli
+
+Options:
+
+    -s STRATEGY  play this strategy instead of the one named by the player
+    -t FILE      append the times spent importing, parsing and deciding to
+                 FILE, '-' for stderr (do not use it with the local
+                 transport, which reads stderr as a part of the answer)
+
+Parsing covers reading the request and creating the State, the state is
+parsed further as the strategy looks at it, which counts as deciding.
+"""
+import getopt
+import logging
+import sys
+import time
+
+START = time.time()
+
+
+def main(argv=None):
+    opts = dict(getopt.getopt(sys.argv[1:] if argv is None else argv,
+                              's:t:')[0])
+    # the local transport reads stderr too, nothing may be printed there
+    logging.getLogger().addHandler(logging.NullHandler())
+    from poker.bot import State, get_bot_class
+    from poker.worker import parse_request
+    imported = time.time()
+    name, pocket, actions, state = parse_request(sys.stdin.read())
+    parsed = None
+    try:
+        bot = get_bot_class(opts.get('-s', name))(
+            State(name, pocket, actions, state))
+        parsed = time.time()
+        decision = bot.decide()
+    except Exception as e:
+        # not a valid action, so the croupier logs it and folds
+        decision = 'error: %s' % e
+    decided = time.time()
+    parsed = parsed or decided
+    sys.stdout.write(decision + '\n')
+    sys.stdout.flush()
+    if '-t' in opts:
+        report = 'import %.1f ms, parse %.1f ms, decide %.1f ms\n' % (
+            (imported - START) * 1000, (parsed - imported) * 1000,
+            (decided - parsed) * 1000)
+        if opts['-t'] == '-':
+            sys.stderr.write(report)
+        else:
+            with open(opts['-t'], 'a') as f:
+                f.write(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Estimate the equity of a hand against several opponents.
+
+Equity is the probability of winning the pot at the showdown, where a tie
+between k players counts as 1/k of a win. All cards are passed around as
+card codes of `robopoker.evaluator`.
+"""
+import itertools
+import time
+import numpy
+from robopoker import evaluator
+
+# how many deals to sample if not told otherwise
+DEFAULT_SAMPLES = 1000
+# how many deals to evaluate at once
+BATCH_SIZE = 500
+# enumerate all deals instead of sampling if there are at most this many
+DEFAULT_EXACT_LIMIT = 50000
+
+_rng = numpy.random.RandomState()
+
+
+def seed(value=None):
+    """Seed the random generator used when none is passed explicitly"""
+    _rng.seed(value)
+
+
+def unknown_cards(known):
+    """Return array of card codes that are not in `known`"""
+    return numpy.array(sorted(set(range(52)) - set(known)), dtype=numpy.int64)
+
+
+def monte_carlo(hole, community, opponents=1, samples=DEFAULT_SAMPLES,
+                time_budget=None, rng=None):
+    """Estimate equity by dealing random opponent holes and board cards.
+
+    :param hole: codes of my two hole cards
+    :param community: codes of the community cards already on the table
+    :param opponents: number of opponents still in the hand
+    :param samples: maximum number of deals to sample
+    :param time_budget: if set, stop sampling after this many seconds (but
+        always sample at least one batch)
+    :param rng: `numpy.random.RandomState`, the module one by default
+    """
+    total, done = sample(hole, community, opponents, samples, time_budget,
+                         rng)
+    return total / done
+
+
+def sample(hole, community, opponents=1, samples=DEFAULT_SAMPLES,
+           time_budget=None, rng=None):
+    """Sample deals like `monte_carlo`, but return the sum of the wins and
+    the number of deals, so that the estimate can be refined later
+    """
+    rng = rng or _rng
+    deadline = time_budget and time.time() + time_budget
+    deck = unknown_cards(list(hole) + list(community))
+    total = 0.0
+    done = 0
+    while done < samples:
+        size = min(BATCH_SIZE, samples - done)
+        total += _showdown(hole, community, opponents,
+                           _draw(rng, deck, size,
+                                 2 * opponents + 5 - len(community)))
+        done += size
+        if deadline and time.time() >= deadline:
+            break
+    return total, done
+
+
+def exact(hole, community, opponents=1):
+    """Compute equity by enumerating every possible deal.
+
+    The number of deals is given by `deal_count`, this is only feasible on
+    the turn and the river against a few opponents.
+    """
+    deck = unknown_cards(list(hole) + list(community))
+    deals, boards = _deals(deck, 5 - len(community), opponents)
+    # my hand depends only on the board, rate it once for every board
+    mine = _rate(hole, community, _combinations(deck, 5 - len(community)))
+    total = 0.0
+    for start in range(0, len(deals), BATCH_SIZE * 20):
+        end = start + BATCH_SIZE * 20
+        total += _showdown(hole, community, opponents, deals[start:end],
+                           mine[boards[start:end]])
+    return total / len(deals)
+
+
+def calculate(hole, community, opponents=1, samples=DEFAULT_SAMPLES,
+              time_budget=None, rng=None, exact_limit=DEFAULT_EXACT_LIMIT):
+    """Compute the exact equity if there are at most `exact_limit` possible
+    deals, otherwise estimate it with `monte_carlo`.
+    """
+    unknown = 52 - len(hole) - len(community)
+    if deal_count(unknown, 5 - len(community), opponents) <= exact_limit:
+        return exact(hole, community, opponents)
+    return monte_carlo(hole, community, opponents, samples, time_budget, rng)
+
+
+def deal_count(unknown, missing, opponents):
+    """Return the number of ways to deal `missing` board cards and the holes
+    of `opponents` from `unknown` cards
+    """
+    count = _choose(unknown, missing)
+    unknown -= missing
+    for i in range(opponents):
+        count *= _choose(unknown, 2)
+        unknown -= 2
+    return count
+
+
+def _choose(n, k):
+    if k < 0 or k > n:
+        return 0
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def _deals(deck, missing, opponents):
+    """Return array with every deal as a row of the missing board cards
+    followed by two hole cards for every opponent, and the index of the
+    board of every deal in `_combinations(deck, missing)`
+    """
+    deals = _combinations(deck, missing)
+    boards = numpy.arange(len(deals))
+    pairs = _combinations(deck, 2)
+    pair_masks = numpy.left_shift(1, pairs).sum(axis=1)
+    for i in range(opponents):
+        # cards are unique, so the sum of card bits is their union
+        masks = numpy.left_shift(1, deals).sum(axis=1)
+        rows, cols = numpy.nonzero(
+            (masks[:, numpy.newaxis] & pair_masks[numpy.newaxis, :]) == 0)
+        deals = numpy.hstack([deals[rows], pairs[cols]])
+        boards = boards[rows]
+    return deals, boards
+
+
+def _draw(rng, deck, size, count):
+    """Return `size` rows of `count` cards drawn from `deck`, by shuffling
+    only the first `count` cards of every row (Fisher-Yates)
+    """
+    cards = numpy.tile(deck, (size, 1))
+    rows = numpy.arange(size)
+    for i in range(count):
+        picked = i + (rng.rand(size) * (len(deck) - i)).astype(numpy.int64)
+        chosen = cards[rows, picked]
+        cards[rows, picked] = cards[:, i]
+        cards[:, i] = chosen
+    return cards[:, :count]
+
+
+def _combinations(deck, size):
+    return numpy.array(list(itertools.combinations(deck, size)),
+                       dtype=numpy.int64).reshape(_choose(len(deck), size),
+                                                  size)
+
+
+def _rate(cards, community, drawn):
+    """Return the scores of `cards` with the community cards and every row
+    of `drawn`
+    """
+    known = numpy.array(list(cards) + list(community), dtype=numpy.int64)
+    return evaluator.rate_many(
+        numpy.hstack([numpy.tile(known, (len(drawn), 1)), drawn]))
+
+
+def _showdown(hole, community, opponents, drawn, mine=None):
+    """Return sum of equities over deals in `drawn`.
+
+    Each row of `drawn` holds the missing board cards followed by two hole
+    cards for every opponent.
+
+    :param mine: scores of my hand in the deals if already known
+    """
+    size = len(drawn)
+    missing = 5 - len(community)
+    board = numpy.hstack([numpy.tile(numpy.array(community, dtype=numpy.int64),
+                                     (size, 1)),
+                          drawn[:, :missing]])
+    if mine is None:
+        mine = _rate(hole, community, drawn[:, :missing])
+    best = numpy.zeros(size, dtype=mine.dtype)
+    ties = numpy.zeros(size)
+    for i in range(opponents):
+        start = missing + 2 * i
+        theirs = evaluator.rate_many(
+            numpy.hstack([drawn[:, start:start + 2], board]))
+        ties += theirs == mine
+        best = numpy.maximum(best, theirs)
+    won = mine > best
+    split = (mine == best) / (ties + 1.0)
+    return float(won.sum() + split.sum())
@@ -0,0 +1,148 @@
+"""Results ledger that many processes can add to at once.
+
+Every hand adds one JSON line of the players' deltas to the ledger file,
+which is only ever appended to under an exclusive `flock`. The totals are
+kept in a snapshot file together with the size of the ledger they cover,
+so reading the totals takes the snapshot plus the lines added since. The
+snapshot is brought up to date (compacted) whenever that tail grows over
+`COMPACT_BYTES`, and it is replaced atomically, so readers need no lock.
+An unterminated last line, left by a writer that crashed, is cut off by the
+next writer.
+"""
+import fcntl
+import json
+import logging
+import os
+
+LOG = logging.getLogger("bot")
+
+# size of the ledger not covered by the snapshot that triggers compaction
+COMPACT_BYTES = 64 * 1024
+
+
+class Ledger(object):
+
+    def __init__(self, path, compact_bytes=COMPACT_BYTES):
+        self.path = path
+        self.snapshot_path = path + '.snapshot'
+        self.compact_bytes = compact_bytes
+
+    def add(self, deltas):
+        """Record the results of one hand
+
+        :param deltas: dict of player name -> money won (or lost)
+        """
+        fd = self._lock()
+        try:
+            os.write(fd, json.dumps(deltas, sort_keys=True) + '\n')
+            size = os.fstat(fd).st_size
+            if size - self._read_snapshot()[0] > self.compact_bytes:
+                self._compact()
+        finally:
+            os.close(fd)  # releases the lock
+
+    def import_totals(self, path):
+        """Start an empty ledger from the totals in a JSON file of player
+        name -> money won (the format of the old stats.json)
+
+        :returns: True if the totals were imported
+        """
+        fd = self._lock()
+        try:
+            if os.fstat(fd).st_size or not os.path.exists(path):
+                return False
+            with open(path) as f:
+                totals = json.load(f)
+            os.write(fd, json.dumps(totals, sort_keys=True) + '\n')
+            return True
+        finally:
+            os.close(fd)
+
+    def totals(self):
+        """Return dict of player name -> money won in all hands"""
+        offset, totals = self._read_snapshot()
+        self._read_tail(offset, totals)
+        return totals
+
+    def compact(self):
+        """Bring the snapshot of the totals up to date"""
+        fd = self._lock()
+        try:
+            self._compact()
+        finally:
+            os.close(fd)
+
+    def _lock(self):
+        """Open the ledger for appending under the exclusive lock, which is
+        released when the returned descriptor is closed
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            self._cut_partial_line(fd)
+        except Exception:
+            os.close(fd)
+            raise
+        return fd
+
+    def _cut_partial_line(self, fd):
+        # nobody else is appending, an unterminated last line is left by a
+        # writer that crashed
+        size = end = os.fstat(fd).st_size
+        while end:
+            start = max(0, end - 4096)
+            os.lseek(fd, start, os.SEEK_SET)
+            newline = os.read(fd, end - start).rfind('\n')
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            LOG.warning('%s: cutting off %d bytes of an unfinished line',
+                        self.path, size - end)
+            os.ftruncate(fd, end)
+
+    def _compact(self):
+        # the caller holds the lock, nobody is appending
+        offset, totals = self._read_snapshot()
+        offset = self._read_tail(offset, totals)
+        tmp = '%s.%d' % (self.snapshot_path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump({'offset': offset, 'totals': totals}, f)
+        os.rename(tmp, self.snapshot_path)
+
+    def _read_snapshot(self):
+        """Return the size of the ledger covered by the snapshot and the
+        totals in it
+        """
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except IOError:
+            return 0, {}
+        return snapshot['offset'], snapshot['totals']
+
+    def _read_tail(self, offset, totals):
+        """Add the deltas recorded after `offset` to the totals
+
+        :returns: offset after the last complete line
+        """
+        try:
+            f = open(self.path)
+        except IOError:
+            return offset
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # being written just now
+                offset += len(line)
+                try:
+                    deltas = json.loads(line)
+                except ValueError:
+                    LOG.warning('%s: skipping broken line at %d', self.path,
+                                offset - len(line))
+                    continue
+                for name, delta in deltas.items():
+                    totals[name] = totals.get(name, 0) + delta
+        return offset
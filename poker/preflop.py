@@ -0,0 +1,112 @@
+"""Precomputed preflop equity of the 169 starting hand classes.
+
+A starting hand class is the two ranks (higher first) plus 's' for suited or
+'o' for offsuit hands, e.g. 'AKs', 'T9o' or 'QQ'. The table holds the equity
+of every class against 1 to `MAX_OPPONENTS` random hands. It is generated by
+running this module:
+
+    $ python -m poker.preflop [samples] [seed]
+
+which overwrites `TABLE_FILE`. Bump `VERSION` whenever the meaning of the
+table changes, an outdated table is ignored.
+"""
+import json
+import logging
+import os.path
+import sys
+import numpy
+from robopoker import evaluator
+from poker import equity
+
+LOG = logging.getLogger("bot")
+
+VERSION = 1
+MAX_OPPONENTS = 8
+TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'preflop.json')
+DEFAULT_SAMPLES = 20000
+
+_table = None
+
+
+def hand_class(hole):
+    """Return the starting hand class of two cards like ['AS', 'KD']"""
+    first, second = sorted(hole, key=lambda card: evaluator.CODES[card],
+                           reverse=True)
+    if first[0] == second[0]:
+        return first[0] + second[0]
+    return first[0] + second[0] + ('s' if first[1] == second[1] else 'o')
+
+
+def hand_classes():
+    """Return all 169 starting hand classes"""
+    ranks = evaluator.RANK_CHARS[::-1]
+    classes = []
+    for i, high in enumerate(ranks):
+        classes.append(high + high)
+        for low in ranks[i + 1:]:
+            classes.append(high + low + 's')
+            classes.append(high + low + 'o')
+    return classes
+
+
+def lookup(hole, opponents):
+    """Return the preflop equity of the hole cards like ['AS', 'KD'] against
+    `opponents` random hands, or None if it is not in the table
+    """
+    table = load()
+    if table is None or not 1 <= opponents <= MAX_OPPONENTS:
+        return None
+    return table[hand_class(hole)][opponents - 1]
+
+
+def load():
+    """Return the table as a dict of class -> equities, loaded on first use"""
+    global _table
+    if _table is None:
+        try:
+            with open(TABLE_FILE) as f:
+                data = json.load(f)
+        except IOError:
+            LOG.warning("Preflop table %s not found", TABLE_FILE)
+            data = {'version': None}
+        if data['version'] != VERSION:
+            LOG.warning("Preflop table %s is outdated", TABLE_FILE)
+            _table = False
+        else:
+            _table = data['equity']
+    return _table or None
+
+
+def generate(samples=DEFAULT_SAMPLES, seed=0):
+    """Compute the table by sampling every class against every number of
+    opponents, the result depends only on `samples` and `seed`
+    """
+    rng = numpy.random.RandomState(seed)
+    table = {}
+    for cls in hand_classes():
+        suits = 'SS' if cls.endswith('s') else 'SH'
+        hole = [evaluator.CODES[cls[0] + suits[0]],
+                evaluator.CODES[cls[1] + suits[1]]]
+        table[cls] = [round(equity.monte_carlo(hole, [], opponents, samples,
+                                               rng=rng), 4)
+                      for opponents in range(1, MAX_OPPONENTS + 1)]
+    return {'version': VERSION, 'samples': samples, 'seed': seed,
+            'equity': table}
+
+
+def save(data, filename=TABLE_FILE):
+    """Write the table with one starting hand class per line"""
+    rows = ['%s: %s' % (json.dumps(cls), json.dumps(data['equity'][cls]))
+            for cls in hand_classes()]
+    with open(filename, 'w') as f:
+        f.write('{"version": %d, "samples": %d, "seed": %d, "equity": {\n'
+                % (data['version'], data['samples'], data['seed']))
+        f.write(',\n'.join(rows))
+        f.write('\n}}\n')
+
+
+if __name__ == '__main__':
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SAMPLES
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    save(generate(samples, seed))
@@ -0,0 +1,362 @@
+"""Pre-forked HTTP server of the bot for robopoker's http transport.
+
+The parent process opens the listening socket, loads the evaluator tables
+and the bot modules, and forks `WORKERS` worker processes that accept from
+the shared socket. The tables are memory-mapped, so the workers share them
+through the page cache. Every worker serves its keep-alive connections
+one request at a time, so a slow request holds up only its own worker. The
+parent restarts workers that die. Usage:
+
+    $ python -m poker.server [-b HOST] [-p PORT] [-w WORKERS] \\
+          [-d DEADLINE] [-l LOG_FILE]
+
+Every decision must be made within `DEADLINE` seconds (well below the
+croupier's `HTTP.TIMEOUT`) of receiving the request, so the time the
+request waited for the worker to finish the requests before it counts too.
+The bot is told the deadline and refines its answer while there is time, if
+it still does not answer in time it is interrupted and the server answers
+check, or fold if it cannot check. A request that waited so long that
+less than `MIN_DECISION` seconds are left gets that answer at once. The
+interruption may come in the middle of anything, e.g. of updating the
+caches, so the worker then closes its connections and exits, and the
+parent starts a fresh one.
+Every worker keeps the hands it answers in `poker.session.sessions`. GET
+/stats returns a JSON with the histogram of the request latencies of all
+workers.
+"""
+import BaseHTTPServer
+import argparse
+import errno
+import json
+import logging
+import multiprocessing
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+import urlparse
+from robopoker import evaluator
+from poker import bot, equity, logs, session
+
+LOG = logging.getLogger("bot")
+
+WORKERS = multiprocessing.cpu_count()
+# seconds a decision may take, robopoker's HTTP transport waits for 5
+DEADLINE = 3.0
+# seconds left to the deadline that are still worth asking the bot
+MIN_DECISION = 0.05
+# seconds an idle keep-alive connection is kept open
+IDLE_TIMEOUT = 30
+# seconds a client may take to send the rest of a started request
+READ_TIMEOUT = 5
+# upper bounds of the latency histogram buckets in milliseconds, the last
+# bucket counts the slower requests
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Deadline(Exception):
+    pass
+
+
+class Stats(object):
+    """Request counters shared by all the workers
+
+    Create it before forking, the counters live in shared memory.
+    """
+
+    def __init__(self):
+        self.histogram = multiprocessing.Array('l', len(BUCKETS) + 1)
+        self.deadlines = multiprocessing.Value('l')
+        self.errors = multiprocessing.Value('l')
+
+    def record(self, seconds):
+        milliseconds = seconds * 1000
+        bucket = next((i for i, bound in enumerate(BUCKETS)
+                       if milliseconds <= bound), len(BUCKETS))
+        with self.histogram.get_lock():
+            self.histogram[bucket] += 1
+
+    def count(self, counter):
+        with counter.get_lock():
+            counter.value += 1
+
+    def as_dict(self):
+        with self.histogram.get_lock():
+            histogram = self.histogram[:]
+        return {
+            'buckets_ms': list(BUCKETS) + [None],
+            'histogram': histogram,
+            'requests': sum(histogram),
+            'deadlines': self.deadlines.value,
+            'errors': self.errors.value,
+        }
+
+
+def fallback(actions):
+    """Return the safe action when there is no time to decide"""
+    return 'check' if 'check' in actions else 'fold'
+
+
+def decide(name, pocket, actions, state, deadline):
+    """Return the decision of the bot, interrupted at the `deadline`
+
+    The bot is told the deadline and should answer before it, the
+    interruption is the last resort, after which the worker is replaced.
+
+    :param deadline: time.time() by which the bot must decide
+    :raises Deadline: if the bot did not decide in time
+    """
+    def expired(signum, frame):
+        raise Deadline('no decision by the deadline')
+    previous = signal.signal(signal.SIGALRM, expired)
+    # setitimer(0) would cancel the timer instead of firing it
+    signal.setitimer(signal.ITIMER_REAL, max(deadline - time.time(), 1e-6))
+    try:
+        return bot.decide(name, pocket, actions, state, deadline,
+                          session.sessions)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves the requests of one connection as they come
+
+    Unlike in `BaseHTTPServer` the connection is not served until it is
+    closed: the worker calls `serve_one` whenever the socket is readable.
+    robopoker waits for every answer before it sends the next request, so
+    no request is left in the read buffer between the calls.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    timeout = READ_TIMEOUT
+
+    def __init__(self, request, client_address, server):
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.setup()
+        self.last_used = time.time()
+
+    def serve_one(self, received):
+        """Serve one request, return False if the connection is closed
+
+        :param received: time.time() by which the request arrived, the
+            deadline runs from it
+        """
+        self.received = received
+        self.close_connection = 1
+        try:
+            self.handle_one_request()
+        except socket.error:
+            pass
+        self.last_used = time.time()
+        return not self.close_connection
+
+    def close(self):
+        try:
+            self.finish()
+        except socket.error:
+            pass
+        self.request.close()
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        if url.path == '/stats':
+            self.respond(json.dumps(self.server.stats.as_dict()),
+                         'application/json')
+        else:
+            self.answer(url.query)
+
+    def do_POST(self):
+        length = int(self.headers.getheader('Content-Length', 0))
+        self.answer(self.rfile.read(length))
+
+    def answer(self, query):
+        form = dict((key, values[0]) for key, values
+                    in urlparse.parse_qs(query).items())
+        actions = form.get('actions', '')
+        deadline = self.received + self.server.deadline
+        try:
+            if deadline - time.time() < MIN_DECISION:
+                LOG.warning('request waited %.3f s, no time to decide',
+                            time.time() - self.received)
+                self.server.stats.count(self.server.stats.deadlines)
+                decision = fallback(actions.split())
+            else:
+                decision = decide(form.get('name', ''),
+                                  form.get('pocket', ''), actions,
+                                  form.get('state', ''), deadline)
+        except Deadline as e:
+            LOG.warning('%s, replacing the worker', e)
+            self.server.stats.count(self.server.stats.deadlines)
+            decision = fallback(actions.split())
+            # the bot was interrupted anywhere, its module state (caches
+            # and sessions) cannot be trusted any more
+            self.server.retiring = True
+        except Exception as e:
+            LOG.exception(e)
+            self.server.stats.count(self.server.stats.errors)
+            # not a valid action, so the croupier logs it and folds
+            decision = 'error: %s' % e
+        self.respond(decision, 'text/plain')
+        self.server.stats.record(time.time() - self.received)
+
+    def respond(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.retiring:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOG.debug(format, *args)
+
+
+class Server(object):
+    """The listening socket and the worker processes
+
+    :param address: (host, port), port 0 picks a free port
+    """
+
+    def __init__(self, address=('', 8080), workers=WORKERS,
+                 deadline=DEADLINE):
+        self.workers = workers
+        self.deadline = deadline
+        self.stats = Stats()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(address)
+        self.socket.listen(128)
+        # all the workers wake up on a new connection, one gets it
+        self.socket.setblocking(0)
+        self.address = self.socket.getsockname()
+        self.pids = []
+        # set in a worker that has to exit
+        self.retiring = False
+
+    def start(self):
+        """Load everything the workers share and fork them"""
+        evaluator.build_arrays()
+        while len(self.pids) < self.workers:
+            self.pids.append(self.fork())
+
+    def fork(self):
+        pid = os.fork()
+        if pid:
+            return pid
+        status = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            # do not deal the same cards in all the workers
+            random.seed()
+            equity.seed()
+            self.serve()
+        except Exception as e:
+            LOG.exception(e)
+            status = 1
+        finally:
+            os._exit(status)
+
+    def supervise(self):
+        """Restart the workers that die, until `stop` is called"""
+        while self.pids:
+            try:
+                pid, status = os.wait()
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if pid in self.pids:
+                if status:
+                    LOG.error('worker %d exited with %d, restarting',
+                              pid, status)
+                else:
+                    LOG.info('worker %d retired, starting a new one', pid)
+                self.pids[self.pids.index(pid)] = self.fork()
+
+    def stop(self):
+        pids, self.pids = self.pids, []
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        self.socket.close()
+
+    def serve(self):
+        """Serve the connections of one worker until it has to retire"""
+        connections = {}
+        polled = time.time()
+        while not self.retiring:
+            sockets = [self.socket] + connections.keys()
+            readable = self.poll(sockets, 0)
+            if readable:
+                # sent while the worker was busy, any time since it last
+                # looked, the requests may have waited for that long
+                received, polled = polled, time.time()
+            else:
+                readable = self.poll(sockets, IDLE_TIMEOUT)
+                received = polled = time.time()
+            for sock in readable:
+                if self.retiring:
+                    break
+                if sock is self.socket:
+                    try:
+                        conn, address = self.socket.accept()
+                    except socket.error:
+                        continue  # another worker was faster
+                    conn.setblocking(1)
+                    connections[conn] = Handler(conn, address, self)
+                elif not connections[sock].serve_one(received):
+                    connections.pop(sock).close()
+            idle = time.time() - IDLE_TIMEOUT
+            for sock, handler in connections.items():
+                if handler.last_used < idle or self.retiring:
+                    connections.pop(sock).close()
+
+    def poll(self, sockets, timeout):
+        """Return the readable sockets"""
+        try:
+            return select.select(sockets, [], [], timeout)[0]
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return []
+            raise
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve the bot to robopoker\'s http transport.')
+    parser.add_argument('-b', '--bind', default='',
+                        help='address to listen on, all by default')
+    parser.add_argument('-p', '--port', type=int, default=8080)
+    parser.add_argument('-w', '--workers', type=int, default=WORKERS)
+    parser.add_argument('-d', '--deadline', type=float, default=DEADLINE,
+                        help='seconds a decision may take')
+    parser.add_argument('-l', '--log-file', default='',
+                        help='log into the file instead of stderr')
+    args = parser.parse_args(argv)
+    logs.set_logging_options(color=not args.log_file, filename=args.log_file)
+    server = Server((args.bind, args.port), args.workers, args.deadline)
+
+    def terminate(signum, frame):
+        server.stop()
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, terminate)
+    signal.signal(signal.SIGINT, terminate)
+    server.start()
+    LOG.info('serving on %s:%d with %d workers', server.address[0],
+             server.address[1], args.workers)
+    server.supervise()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""What the bot server remembers about the hands being played.
+
+robopoker sends the whole state of the hand with every request, so each
+request of a hand is answered from scratch. A session is where a strategy
+keeps what it wants to remember between the requests of one hand of one
+player (`State.session`). The equity sampled so far needs no session, it
+is kept by `poker.state.equity_cache` under a key of the spot, shared by
+all the hands. Sessions are kept in a `SessionCache` under the key
+returned by `session_key`. The cache may be shared by the threads of a
+threaded server.
+"""
+import collections
+import threading
+import time
+
+# how many hands to remember
+SIZE = 1000
+# seconds after the last request when the hand is considered over
+TTL = 60
+
+
+class Session(object):
+    """The state of one hand of one player"""
+
+    def __init__(self):
+        self.requests = 0
+
+
+class SessionCache(object):
+    """Bounded cache of sessions, a session expires `ttl` seconds after it
+    was last used and the least recently used one is dropped first when the
+    cache is full
+    """
+
+    def __init__(self, size=SIZE, ttl=TTL):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the session of the key, a new one if there is none"""
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            try:
+                used, session = self._data.pop(key)
+                self.hits += 1
+            except KeyError:
+                session = Session()
+                self.misses += 1
+            self._data[key] = now, session
+            if len(self._data) > self.size:
+                self._data.popitem(last=False)
+            session.requests += 1
+            return session
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _expire(self, now):
+        # the sessions are ordered by the time of their last use
+        while self._data:
+            key, (used, session) = next(self._data.iteritems())
+            if used > now - self.ttl:
+                break
+            del self._data[key]
+
+
+def session_key(player_name, hole, players):
+    """Return the key of the hand
+
+    :param hole: list of my Card objects
+    :param players: all players at the table as dicts with 'name' and
+        'in_stack', the stacks at the start of the hand tell the hands
+        of the same players apart
+    """
+    return (player_name, tuple(sorted(repr(card) for card in hole)),
+            tuple((p['name'], p['in_stack']) for p in players))
+
+
+sessions = SessionCache()
@@ -0,0 +1,218 @@
+"""Play many hands between our bots in a single process.
+
+The hands are conducted by robopoker's Croupier, but the bots are called
+directly instead of through a transport and they get the HandState object
+instead of its XML dump. Stacks are carried over from hand to hand, a busted
+player rebuys the initial stack. Usage:
+
+    $ python -m poker.simulator [-n HANDS] [-s SEED] [--archive DIR] \\
+          [-e DEALS] NAME:STRATEGY ...
+
+e.g. `python -m poker.simulator -n 10000 alice:smart bob:simple`
+
+It plays about 3000 hands/s per core with the strategies that do not
+compute equity, the Croupier itself takes about 250 us a hand. The
+strategies that compute equity spend nearly all the time on it: heads-up
+they evaluate 1000 deals on the flop and all 45540 deals of the turn, about
+50 hands/s. `-e DEALS` caps the deals of every decision, sampling instead
+of enumerating the turn, e.g. 200 deals play about 400 hands/s at the cost
+of a few per cent of accuracy. More needs `poker.tournament`, which plays
+on all cores.
+"""
+import argparse
+import math
+import random
+import time
+from robopoker import archive
+from robopoker.croupier import Croupier
+from robopoker.entities import CardSet, Deck, Player, Table
+from robopoker.handstate.interface import HandState
+from poker import equity
+from poker.bot import get_bot_class
+from poker.state import State, equity_cache
+
+BIG_BLIND = 20
+DEFAULT_STACK = 1000
+
+
+class InProcess(object):
+    """Transport that calls the bot strategy directly"""
+
+    def __init__(self, strategy, equity_deals=None):
+        self.service = strategy
+        self.bot_class = get_bot_class(strategy)
+        self.equity_deals = equity_deals
+
+    def message(self, name, pocket, actions, state):
+        state = State.from_handstate(name, pocket, actions, state)
+        if self.equity_deals is not None:
+            state.EQUITY_SAMPLES = self.equity_deals
+            state.EXACT_EQUITY_LIMIT = self.equity_deals
+        return self.bot_class(state).decide()
+
+    def type(self):
+        return 'inprocess'
+
+
+class SimulationCroupier(Croupier):
+    """Croupier that sends the HandState itself to the bots and logs
+    nothing
+    """
+
+    def __init__(self, state):
+        super(SimulationCroupier, self).__init__(state, None)
+
+    def public_state(self, player):
+        return self.state
+
+    def log_act(self, player, act):
+        pass
+
+    def log_winners(self):
+        pass
+
+    def _log(self, s='', nl=True):
+        pass
+
+
+class Simulator(object):
+
+    def __init__(self, lineup, stack=DEFAULT_STACK, seed=None, archive=None,
+                 equity_deals=None):
+        """
+        :param lineup: list of (player name, strategy name) in sit order
+        :param stack: initial stack of every player
+        :param seed: if set, seed the random generators used by the deck and
+            the bots (and empty the equity cache) so that the results depend
+            only on the seed
+        :param archive: `robopoker.archive.Writer` to record the hands in
+        :param equity_deals: if set, the bots evaluate at most this many
+            deals when computing equity, they sample it unless there are
+            at most this many possible deals
+        """
+        if seed is not None:
+            random.seed(seed)
+            equity.seed(seed)
+            equity_cache.clear()
+        self.stack = stack
+        self.archive = archive
+        self.hands = 0
+        self.table = Table(size=len(lineup))
+        self.results = {}
+        for sit, (name, strategy) in enumerate(lineup):
+            self.table.sit_in(
+                Player(name, InProcess(strategy, equity_deals), stack), sit)
+            self.results[name] = new_result(strategy)
+
+    def play(self, hands):
+        """Play `hands` more hands and return the results"""
+        for i in range(hands):
+            self.play_hand()
+        return self.results
+
+    def play_hand(self):
+        deck = Deck()
+        deck.shuffle()
+        state = HandState(self.table, deck)
+        SimulationCroupier(state).conduct()
+        if self.archive is not None:
+            self.archive.append(state, BIG_BLIND)
+        for player in self.table.players():
+            won = player.stack - player.initial_stack
+            result = self.results[player.name]
+            result['hands'] += 1
+            result['won'] += won
+            result['won_sq'] += won * won
+            if not player.stack:
+                player.stack = self.stack
+                result['rebuys'] += 1
+            reset_player(player)
+        self.hands += 1
+        self.rotate_button()
+
+    def rotate_button(self):
+        occupied = self.table.occupied_sits()
+        following = [sit for sit in occupied if sit > self.table.button]
+        self.table.button = (following or occupied)[0]
+
+
+def new_result(strategy):
+    """Return empty results of one player"""
+    return {'strategy': strategy, 'hands': 0, 'won': 0, 'won_sq': 0,
+            'rebuys': 0}
+
+
+def reset_player(player):
+    """Prepare the player for the next hand"""
+    player.pocket = CardSet()
+    player.hand = None
+    player.initial_stack = player.stack
+    player.folded = False
+    player.allin = False
+    player.bet = None
+    player.blind = 0
+    player.win = 0
+
+
+def bb_per_100(result):
+    """Return big blinds won per 100 hands and the half-width of its 95%
+    confidence interval
+    """
+    hands = result['hands']
+    if not hands:
+        return 0.0, 0.0
+    mean = result['won'] / float(hands)
+    variance = max(0.0, result['won_sq'] / float(hands) - mean * mean)
+    error = 1.96 * math.sqrt(variance / hands)
+    return mean / BIG_BLIND * 100, error / BIG_BLIND * 100
+
+
+def report(results):
+    """Return the results as a printable table"""
+    lines = ['%-12s %-18s %8s %10s %16s %6s' % (
+        'player', 'strategy', 'hands', 'won', 'bb/100', 'rebuys')]
+    for name in sorted(results, key=lambda n: -results[n]['won']):
+        result = results[name]
+        rate, error = bb_per_100(result)
+        lines.append('%-12s %-18s %8d %10d %8.2f +-%6.2f %6d' % (
+            name, result['strategy'], result['hands'], result['won'], rate,
+            error, result['rebuys']))
+    return '\n'.join(lines)
+
+
+def parse_lineup(players):
+    """Parse list of 'name:strategy' (or just 'strategy') strings"""
+    lineup = []
+    for i, player in enumerate(players):
+        name, _, strategy = player.rpartition(':')
+        lineup.append((name or '%s%d' % (strategy, i), strategy))
+    return lineup
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Play hands between bots in a single process')
+    parser.add_argument('players', nargs='+', metavar='NAME:STRATEGY')
+    parser.add_argument('-n', '--hands', type=int, default=1000)
+    parser.add_argument('-s', '--seed', type=int, default=None)
+    parser.add_argument('--stack', type=int, default=DEFAULT_STACK)
+    parser.add_argument('--archive', metavar='DIR',
+                        help='record the hands in this archive')
+    parser.add_argument('-e', '--equity-deals', type=int, default=None,
+                        help='evaluate at most this many deals per decision')
+    args = parser.parse_args()
+    writer = args.archive and archive.Writer(args.archive)
+    simulator = Simulator(parse_lineup(args.players), args.stack, args.seed,
+                          writer, args.equity_deals)
+    start = time.time()
+    results = simulator.play(args.hands)
+    if writer:
+        writer.close()
+    elapsed = time.time() - start
+    print report(results)
+    print '%d hands in %.1f s (%.0f hands/s)' % (
+        args.hands, elapsed, args.hands / elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,50 +1,176 @@
+import collections
 import logging
 import itertools
-import pokereval.card
-from pokereval.hand_evaluator import HandEvaluator
-import xmltodict
+import threading
+import time
 import robopoker.entities
-import robopoker.combinations
 
 LOG = logging.getLogger("bot")
 ROUNDS = ["preflop", "flop", "turn", "river"]
+# every way to rename the 4 suits
+SUIT_PERMUTATIONS = list(itertools.permutations(range(4)))
+# the codes of all the cards under every way to rename the suits
+RENAMED_CODES = [[code & ~3 | perm[code & 3] for code in range(52)]
+                 for perm in SUIT_PERMUTATIONS]
 
 
 class StateParseException(Exception):
     pass
 
 
+class lazy(object):
+    """Decorator of a method that computes an attribute on the first access,
+    the value is then stored in the instance in place of the method
+    """
+
+    def __init__(self, method):
+        self.method = method
+        self.__doc__ = method.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = self.method(instance)
+        instance.__dict__[self.method.__name__] = value
+        return value
+
+
 class State(object):
-    pot = 0      # the money on the table in total
-    max_bet = 0  # what is on the maximum bet on the table (by any player),
-                 # i.e. how much has my bet have to be to continue
+    """What the bot knows about the hand
+
+    The state description is parsed on the first access to any of the
+    fields derived from it (community, players, betting and the bets), so
+    strategies that do not look at them pay nothing for it.
+    """
     bet = 0      # how much money did I already put in
-    players = None
     player_name = ""
     possible_actions = None
     hole = None  # two cards I'm holding in my hand
+    _hand = None  # robopoker's HandState, see from_handstate
+    deadline = None  # time.time() by which the decision must be made
+    sessions = None  # poker.session.SessionCache to keep the hand in
+
+    # how many deals to sample when estimating equity, None for
+    # equity.DEFAULT_SAMPLES
+    EQUITY_SAMPLES = None
+    # if set, stop sampling after this many seconds
+    EQUITY_TIME_BUDGET = None
+    # compute the exact equity if there are at most this many possible deals
+    # of the remaining cards (e.g. heads-up on the turn or the river), set to
+    # 0 to always sample, None for equity.DEFAULT_EXACT_LIMIT
+    EXACT_EQUITY_LIMIT = None
+    # with a deadline, sample up to this many deals while there is time
+    DEADLINE_EQUITY_SAMPLES = 100000
+    # share of the time left until the deadline that sampling may use, the
+    # rest is for deciding and answering
+    DEADLINE_EQUITY_SHARE = 0.8
 
-    def __init__(self, player_name, hole_str, possible_actions_str, state_xml):
+    def __init__(self, player_name, hole_str, possible_actions_str, state_str,
+                 deadline=None, sessions=None):
 
         self.player_name = player_name
-        self.hole = parse_card_representation(hole_str)
-        if len(self.hole) != 2:
-            raise StateParseException("There should be exactly 2 hole cards")
+        self.deadline = deadline
+        self.sessions = sessions
+        self.hole = parse_hole(hole_str)
         self.possible_actions = possible_actions_str.split()
-        self._state = self._parse_xml_state(state_xml)
-        LOG.info("hole: %s", self.hole)
-        LOG.info("possible actions: %s", self.possible_actions)
+        self._text = state_str
+        LOG.info("hole: %s, possible actions: %s", self.hole,
+                 self.possible_actions)
+
+    @classmethod
+    def from_handstate(cls, player_name, hole_str, possible_actions, hand):
+        """Create the state directly from robopoker's HandState object
+        instead of its XML representation, for bots running in the same
+        process as the croupier. Like the text, the HandState is read only
+        when the strategy looks at it.
+        """
+        state = cls(player_name, hole_str, ' '.join(possible_actions), None)
+        state._hand = hand
+        return state
 
     def get_hand_strength(self):
-        # poker eval uses a different representation, we must convert it first
-        hole = [_get_pokereval_representation(card)
-                for card in self.hole]
-        community = [_get_pokereval_representation(card)
-                     for card in self.community]
-        score = HandEvaluator.evaluate_hand(hole, community)
+        """Return the equity against a single opponent"""
+        score = self.get_equity(opponents=1)
         LOG.info("Score %f" % score)
         return score
 
+    def get_equity(self, opponents=None):
+        """Return the probability of winning against the live opponents
+
+        Preflop equity is looked up in the `poker.preflop` table. Results
+        are kept in `equity_cache` under a suit independent key, sampled
+        estimates as the sums of the deals, so that a request that wants
+        more deals than the cached estimate has goes on sampling from it.
+        If there is a deadline, the estimate is refined until its share of
+        the time left runs out (see `DEADLINE_EQUITY_SHARE`), and the
+        later requests of the hand go on refining it.
+
+        :param opponents: number of opponents, by default the number of
+            players who did not fold yet (without me)
+        """
+        # numpy is imported only by the strategies that need it
+        from poker import equity, preflop
+        if opponents is None:
+            opponents = self.opponent_count
+        hole = _get_codes(self.hole)
+        community = _get_codes(self.community)
+        key = canonical_key(hole, community, opponents)
+        known = equity_cache.get(key)
+        if known is not None and known[1] is None:
+            return known[0]
+        if known is None and not community:
+            score = preflop.lookup([repr(card) for card in self.hole],
+                                   opponents)
+            if score is not None:
+                equity_cache.put(key, (score, None))
+                return score
+        samples = self.EQUITY_SAMPLES
+        if samples is None:
+            samples = equity.DEFAULT_SAMPLES
+        exact_limit = self.EXACT_EQUITY_LIMIT
+        if exact_limit is None:
+            exact_limit = equity.DEFAULT_EXACT_LIMIT
+        unknown = 52 - len(hole) - len(community)
+        if known is None and equity.deal_count(
+                unknown, 5 - len(community), opponents) <= exact_limit:
+            score = equity.exact(hole, community, opponents)
+            equity_cache.put(key, (score, None))
+            return score
+        time_budget = self.EQUITY_TIME_BUDGET
+        if self.deadline is not None:
+            samples = max(samples, self.DEADLINE_EQUITY_SAMPLES)
+            left = (self.deadline - time.time()) * self.DEADLINE_EQUITY_SHARE
+            if time_budget is not None:
+                left = min(left, time_budget)
+            # one batch is sampled even if the time is up already
+            time_budget = max(left, 1e-6)
+        total, done = known or (0.0, 0)
+        if done < samples:
+            more, sampled = equity.sample(hole, community, opponents,
+                                          samples - done, time_budget)
+            # merged with what other requests sampled meanwhile
+            total, done = equity_cache.add(key, more, sampled, known)
+            if done is None:
+                return total  # computed exactly meanwhile
+        LOG.info("equity of %d deals", done)
+        return total / done
+
+    @lazy
+    def session(self):
+        """The `poker.session.Session` of the hand, None without sessions"""
+        if self.sessions is None:
+            return None
+        from poker.session import session_key
+        return self.sessions.get(session_key(self.player_name, self.hole,
+                                             self._data[1]))
+
+    @property
+    def opponent_count(self):
+        """Return the number of other players who did not fold yet"""
+        if not self.players:
+            return 1
+        return max(1, len(self.players) - 1)
+
     @property
     def round(self):
         """Return one of `ROUNDS`"""
@@ -60,7 +186,7 @@ class State(object):
         count = 0
         actions = self._get_current_round_actions()
         for action in actions:
-            if action['@type'] == 'raise' or action['@type'] == 'bet':
+            if action['type'] == 'raise' or action['type'] == 'bet':
                 count += 1
         return count
 
@@ -68,33 +194,82 @@ class State(object):
     def follower_count(self):
         return 0
 
-    def _parse_xml_state(self, xml):
-        """Take robopoker's description of the state in XML parse in to objects
+    def _load(self, community, players, betting, folded=None):
+        """Fill in the state instead of parsing it
+
+        :param community: list of Card objects
+        :param players: list of dicts with 'name', 'stack' and 'in_stack' of
+            every player at the table
+        :param betting: dict of round name -> list of action dicts with
+            'player', 'type' and 'amount', like in robopoker's HandState
+        :param folded: set of names of the players who folded, found from
+            the betting if not given
         """
-        if not xml:
-            return None
-        LOG.info(xml)
-        state = xmltodict.parse(xml)
-        self.community = parse_community_cards(state)
-        if self.community:
-            if len(self.community) > 5:
-                raise StateParseException("More than 5 community cards: %s"
-                                          % self.community)
-            LOG.info("community: %s", self.community)
-        self.players = parse_players(state)
-        self.pot, self.max_bet, self.my_bet = self._get_bets()
-        return state
+        self._data = community, players, betting, folded
+
+    @lazy
+    def _data(self):
+        """Tuple of the arguments of `_load` taken from the HandState or
+        parsed from robopoker's description of the state, XML or compact JSON
+        """
+        hand = self._hand
+        if hand is not None:
+            players = [{'name': p.name, 'stack': p.stack,
+                        'in_stack': p.initial_stack}
+                       for p in hand.table.players()]
+            return list(hand.community), players, hand.betting, None
+        text = self._text
+        if not text:
+            return [], [], dict((round, []) for round in ROUNDS), set()
+        if text.lstrip().startswith('{'):
+            import json
+            return parse_json_state(json.loads(text)) + (None,)
+        return parse_xml_state(text)
+
+    @lazy
+    def community(self):
+        """List of the community cards"""
+        community = self._data[0]
+        if len(community) > 5:
+            raise StateParseException("More than 5 community cards: %s"
+                                      % community)
+        if community:
+            LOG.info("community: %s", community)
+        return community
+
+    @lazy
+    def betting(self):
+        """Dict of round name -> list of actions in the round"""
+        return self._data[2]
+
+    @lazy
+    def players(self):
+        """List of the players who did not fold yet"""
+        community, players, betting, folded = self._data
+        return active_players(players, betting, folded)
+
+    @lazy
+    def pot(self):
+        """The money on the table in total"""
+        return self._bets[0]
+
+    @lazy
+    def max_bet(self):
+        """What is on the maximum bet on the table (by any player), i.e. how
+        much has my bet have to be to continue
+        """
+        return self._bets[1]
+
+    @lazy
+    def my_bet(self):
+        return self._bets[2]
+
+    @lazy
+    def _bets(self):
+        return self._get_bets()
 
     def _get_current_round_actions(self):
-        round_index = ROUNDS.index(self.round)
-        round = self._state['game']['betting']['round'][round_index]
-        assert round['@name'] == self.round
-        actions = round.get('action', [])
-        if isinstance(actions, dict):
-            # the way we transform xml to dict, if there is only one action in
-            # the round, then if will be just a dict, otherwise it's a
-            # list of dicts - make it so that it's always a list
-            actions = [actions]
+        actions = self.betting[self.round]
         LOG.info("Actions in current round: %s", actions)
         return actions
 
@@ -103,49 +278,199 @@ class State(object):
         max_bet = 0
         my_bet = 0
         for player in self.players:
-            bet = int(player['@in_stack']) - int(player['@stack'])
+            bet = player['in_stack'] - player['stack']
             total_bets += bet
-            if player['@name'] == self.player_name:
+            if player['name'] == self.player_name:
                 my_bet = bet
             if bet > max_bet:
                 max_bet = bet
         return total_bets, max_bet, my_bet
 
 
-def parse_community_cards(state):
-    """Return a list of the community cards
+class EquityCache(object):
+    """Bounded cache of equities, the least recently used one is dropped
+    first when it is full
+
+    The values are (equity, None) for exact equities and (sum of the wins,
+    number of deals) for sampled ones, see `State.get_equity`.
+
+    It is shared by all the threads of the process (e.g. of wsgi.py), so
+    every access is done under a lock. By default it holds the spots of
+    about as many hands as `poker.session` keeps, so the estimates of the
+    hands being played are not dropped.
+    """
+
+    def __init__(self, size=10000):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value or None"""
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def add(self, key, total, done, start=None):
+        """Add sampled deals to the cached (sum of the wins, number of
+        deals) of the key, starting from `start` if it is not cached; an
+        exact value (number of deals None) is kept as it is
+
+        :returns: the new value
+        """
+        with self._lock:
+            value = self._data.pop(key, None) or start or (0.0, 0)
+            if value[1] is not None:
+                value = value[0] + total, value[1] + done
+            self._data[key] = value
+            if len(self._data) > self.size:
+                self._data.popitem(last=False)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+equity_cache = EquityCache()
+
 
-    :param state: returned from xmltodict of the robopoker representation
+def canonical_key(hole, community, opponents):
+    """Return the same key for all spots that differ only by the names of
+    the suits or by the order of the cards
+
+    :param hole: card codes of `robopoker.evaluator`
+    :param community: card codes of `robopoker.evaluator`
     """
-    community_cards = list()
-    community = state['game']['community']
-    if community and 'card' in community:
-        for card in community['card']:
-            new_card = robopoker.entities.Card(card['@rank'], card['@suit'])
-            community_cards.append(new_card)
-    return community_cards
-
-
-def parse_players(state):
-    """Return list of players still in the game"""
-    players = state['game']['table']['player']
-    active_players = list()
-    rounds = state['game']['betting']['round']
-    for i, round in enumerate(rounds):
-        if round and 'action' in round and isinstance(round['action'], dict):
-            # the way we transform xml to dict, if there is only one action in
-            # the round, then if will be just a dict, otherwise it's a
-            # list of dicts - make it so that it's always a list
-            rounds[i]['action'] = [round['action']]
-    actions = [r['action'] for r in rounds if 'action' in r]
-    actions = list(itertools.chain.from_iterable(actions))
-    for player in players:
-        player_fold = [a for a in actions
-                       if (a['@type'] == 'fold'
-                           and a['@player'] == player['@name'])]
-        if not player_fold:
-            active_players.append(player)
-    return active_players
+    # the least of the renamed keys, the community decides only between
+    # the renamings that give the least hole
+    best = None
+    for codes in RENAMED_CODES:
+        key = tuple(sorted([codes[c] for c in hole]))
+        if best is None or key < best:
+            best, candidates = key, [codes]
+        elif key == best:
+            candidates.append(codes)
+    return best, min(tuple(sorted([codes[c] for c in community]))
+                     for codes in candidates), opponents
+
+
+def parse_xml_state(xml):
+    """Return community cards, players, betting and the set of folded players
+    of the state in robopoker's XML format
+    """
+    import xml.etree.cElementTree as ET
+    parser = ET.XMLParser(target=XMLStateTarget())
+    parser.feed(xml)
+    target = parser.close()
+    return target.community, target.players, target.betting, target.folded
+
+
+class XMLStateTarget(object):
+    """Target of ElementTree's XMLParser that collects the state in a single
+    pass over robopoker's XML, without building the element tree
+    """
+
+    def __init__(self):
+        self.community = []
+        self.players = []
+        self.betting = dict((round, []) for round in ROUNDS)
+        self.folded = set()
+        self._path = []
+        self._actions = None
+
+    def start(self, tag, attrib):
+        parent = self._path[-1] if self._path else None
+        self._path.append(tag)
+        if parent == 'community' and tag == 'card':
+            self.community.append(
+                robopoker.entities.Card(attrib['rank'], attrib['suit']))
+        elif parent == 'table' and tag == 'player':
+            self.players.append({'name': attrib['name'],
+                                 'stack': int(attrib['stack']),
+                                 'in_stack': int(attrib['in_stack'])})
+        elif parent == 'betting' and tag == 'round':
+            self._actions = self.betting.setdefault(attrib['name'], [])
+        elif parent == 'round' and tag == 'action':
+            self._actions.append({'player': attrib['player'],
+                                  'type': attrib['type'],
+                                  'amount': int(attrib['amount'])})
+            if attrib['type'] == 'fold':
+                self.folded.add(attrib['player'])
+
+    def end(self, tag):
+        self._path.pop()
+
+    def data(self, data):
+        pass
+
+    def close(self):
+        return self
+
+
+def parse_json_state(state):
+    """Return community cards, players and betting of the state in
+    robopoker's compact JSON format (see `robopoker.handstate.compact`)
+
+    :param state: decoded JSON
+    """
+    community = [robopoker.entities.Card(card[0], card[1])
+                 for card in state['community']]
+    players = [{'name': name, 'stack': stack, 'in_stack': in_stack}
+               for name, sit, in_stack, stack in state['players']]
+    betting = dict((round, [{'player': player, 'type': type, 'amount': amount}
+                            for player, type, amount in actions])
+                   for round, actions in zip(ROUNDS, state['betting']))
+    return community, players, betting
+
+
+def active_players(players, betting, folded=None):
+    """Return list of players still in the game
+
+    :param folded: set of names of the players who folded, if already known
+    """
+    if folded is None:
+        actions = itertools.chain.from_iterable(betting.values())
+        folded = set(a['player'] for a in actions if a['type'] == 'fold')
+    return [player for player in players if player['name'] not in folded]
+
+
+_holes = {}
+
+
+def parse_hole(hole_str):
+    """Return the two hole cards, like `parse_card_representation`
+
+    The same holes are parsed again and again, so they are kept parsed.
+    """
+    hole = _holes.get(hole_str)
+    if hole is None:
+        hole = parse_card_representation(hole_str)
+        if len(hole) != 2:
+            raise StateParseException("There should be exactly 2 hole cards")
+        if len(_holes) < 10000:
+            _holes[hole_str] = hole
+    return list(hole)
 
 
 def parse_card_representation(cards_string):
@@ -165,18 +490,6 @@ def parse_card_representation(cards_string):
     return cards
 
 
-def _get_pokereval_representation(card):
-    rank = robopoker.combinations.RANKS.index(card.rank)
-    if card.suit == 'S':  # spades
-        suit = 1
-    elif card.suit == 'H':  # hearts
-        suit = 2
-    elif card.suit == 'D':  # diamonds
-        suit = 3
-    elif card.suit == 'C':  # clubs
-        suit = 4
-    else:
-        raise Exception("Unknown card suit '%s'" % card)
-    assert rank in range(2, 15)
-    assert suit in range(1, 5)
-    return pokereval.card.Card(rank, suit)
+def _get_codes(cards):
+    """Return card codes of `robopoker.evaluator` for Card objects"""
+    return [card.code for card in cards]
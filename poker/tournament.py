@@ -0,0 +1,101 @@
+"""Play a long match between bots on all CPU cores.
+
+The match is cut into batches of `BATCH_HANDS` hands. Every batch is played
+by `poker.simulator` from fresh stacks with its own seed derived from the
+master seed, and the batch results are merged in batch order. Therefore the
+results depend only on the lineup, the number of hands and the master seed,
+not on the number of worker processes. Usage:
+
+    $ python -m poker.tournament [-n HANDS] [-s SEED] [-w WORKERS] \\
+          [--archive DIR] [-e DEALS] NAME:STRATEGY ...
+"""
+import argparse
+import hashlib
+import multiprocessing
+import time
+from robopoker import archive as hand_archive
+from poker import simulator
+
+# hands played by one worker task
+BATCH_HANDS = 1000
+
+
+def run(lineup, hands, seed=0, workers=None, stack=simulator.DEFAULT_STACK,
+        batch_hands=BATCH_HANDS, archive=None, equity_deals=None):
+    """Play `hands` hands and return the merged results
+
+    :param lineup: list of (player name, strategy name) in sit order
+    :param workers: number of processes, all CPUs by default; with 1 the
+        batches are played in this process
+    :param archive: directory of a `robopoker.archive` to record the hands
+        in, every batch is written as a chunk
+    :param equity_deals: see `poker.simulator.Simulator`
+    """
+    batches = [(lineup, min(batch_hands, hands - start), stack,
+                batch_seed(seed, i), archive, equity_deals)
+               for i, start in enumerate(range(0, hands, batch_hands))]
+    if workers == 1:
+        return merge(map(play_batch, batches))
+    pool = multiprocessing.Pool(workers)
+    try:
+        # map keeps the order of the batches
+        results = pool.map(play_batch, batches, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return merge(results)
+
+
+def batch_seed(seed, index):
+    """Return the seed of the batch, derived from the master seed"""
+    digest = hashlib.sha1('%d:%d' % (seed, index)).hexdigest()
+    return int(digest[:8], 16)
+
+
+def play_batch(args):
+    lineup, hands, stack, seed, archive, equity_deals = args
+    writer = archive and hand_archive.Writer(archive)
+    results = simulator.Simulator(lineup, stack, seed, writer,
+                                  equity_deals).play(hands)
+    if writer:
+        writer.close()
+    return results
+
+
+def merge(results):
+    """Sum results of several batches"""
+    merged = {}
+    for batch in results:
+        for name, result in sorted(batch.items()):
+            total = merged.setdefault(name,
+                                      simulator.new_result(result['strategy']))
+            for key in ('hands', 'won', 'won_sq', 'rebuys'):
+                total[key] += result[key]
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Play hands between bots on several processes')
+    parser.add_argument('players', nargs='+', metavar='NAME:STRATEGY')
+    parser.add_argument('-n', '--hands', type=int, default=10000)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    parser.add_argument('--stack', type=int, default=simulator.DEFAULT_STACK)
+    parser.add_argument('--archive', metavar='DIR',
+                        help='record the hands in this archive')
+    parser.add_argument('-e', '--equity-deals', type=int, default=None,
+                        help='evaluate at most this many deals per decision')
+    args = parser.parse_args()
+    start = time.time()
+    results = run(simulator.parse_lineup(args.players), args.hands,
+                  args.seed, args.workers, args.stack, archive=args.archive,
+                  equity_deals=args.equity_deals)
+    elapsed = time.time() - start
+    print simulator.report(results)
+    print '%d hands in %.1f s (%.0f hands/s)' % (
+        args.hands, elapsed, args.hands / elapsed)
+
+
+if __name__ == '__main__':
+    main()
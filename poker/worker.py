@@ -0,0 +1,65 @@
+"""Long running bot process for robopoker's worker transport.
+
+Reads framed requests from stdin and writes framed decisions to stdout until
+stdin is closed. Use it as the service of a worker player:
+
+    0 kari 200 worker python -m poker.worker
+"""
+import logging
+import os
+import sys
+from poker.bot import decide
+
+LOG = logging.getLogger("bot")
+
+
+def parse_request(text):
+    """Parse the request of robopoker's local transports
+
+    :returns: tuple (name, pocket, actions, state), actions separated by
+        newlines like in the HTTP request
+    """
+    lines = text.split('\n')
+    name, pocket = lines[0], lines[1]
+    end = lines.index('', 3) if '' in lines[3:] else len(lines)
+    actions = lines[3:end]
+    state = '\n'.join(lines[end + 1:])
+    return name, pocket, '\n'.join(actions), state
+
+
+def read_frame(stream):
+    """Return the next payload or None at the end of the stream"""
+    header = stream.readline()
+    if not header:
+        return None
+    return stream.read(int(header))
+
+
+def write_frame(stream, payload):
+    stream.write('%d\n%s' % (len(payload), payload))
+    stream.flush()
+
+
+def serve(requests, responses):
+    while True:
+        request = read_frame(requests)
+        if request is None:
+            break
+        try:
+            response = decide(*parse_request(request))
+        except Exception as e:
+            LOG.exception(e)
+            # not a valid action, so the croupier logs it and folds
+            response = 'error: %s' % e
+        write_frame(responses, response)
+
+
+def main():
+    # anything the bot prints must not get into the responses
+    responses = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    serve(sys.stdin, responses)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,12 +9,21 @@ Create hand mode:
     <INPUT> format:
     # it is a comment
     <sit><b?> <name>   <stack>   <type>   <service>\n for each player
+    <type> is one of:
+        local   <service> is a shell command run for every action,
+                e.g. python -m poker.cli
+        http    <service> is an URL
+        worker  <service> is a shell command kept running for the whole
+                game, e.g. python -m poker.worker
+        python  <service> is package.module:function called in-process
 
 Play hand mode:
     Usage: cat/type initial_hand_state.xml | python platform.py play_hand \
-           1> result_hand_state.xml 2> croupier.log
+           [archive_dir] 1> result_hand_state.xml 2> croupier.log
 
     Perform robopoker play from the initial hand state to the awarding.
+    If archive_dir is given, the hand is also appended to that hand archive
+    (see robopoker/archive.py).
 
 Publish state mode:
     Usage cat/type private.xml | python platform.py publish_state > public.xml
@@ -65,7 +74,7 @@ class Controller(object):
         dest = sys.stdout
         players, button = create_players()
         state = create_state(players, button)
-        dest.write(handstate_repr.dump(state, False))
+        dest.write(handstate_repr.dump(state, False, pretty=True))
 
     def do_play_hand(self):
         source = sys.stdin
@@ -73,7 +82,12 @@ class Controller(object):
         state = handstate_repr.parse(source)
         croupier = Croupier(state, sys.stderr)
         croupier.conduct()
-        dump = handstate_repr.dump(state, False)
+        if len(sys.argv) > 2:
+            from robopoker import archive
+            writer = archive.Writer(sys.argv[2])
+            writer.append(state)
+            writer.close()
+        dump = handstate_repr.dump(state, False, pretty=True)
         print >> dest, dump,
 
     def do_publish_state(self):
@@ -83,7 +97,8 @@ class Controller(object):
         source = sys.stdin
         dest = sys.stdout
         dest.write(handstate_repr.echo(
-            handstate_repr.to_public(handstate_repr.open(source), player)
+            handstate_repr.to_public(handstate_repr.open(source), player),
+            pretty=True
         ))
 
 
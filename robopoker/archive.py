@@ -0,0 +1,266 @@
+"""
+Append-only archive of played hands in columnar chunks.
+
+The archive is a directory of chunks. A chunk is a directory with one
+numpy .npy file per column and a JSON file with the names of the players
+and services its columns refer to. Chunks are complete when they appear
+(they are written under a temporary name and renamed), so several
+processes may append to one archive and readers never see a partial chunk.
+
+There are three tables in a chunk:
+
+    hand    one row per hand
+    seat    one row per player of a hand, rows of a hand are consecutive
+            and ordered by position (0 acts first after the button)
+    action  one row per post or action, rows of a hand are consecutive
+            and in the order of the game
+
+Cards are evaluator codes, -1 where there is no card. Columns of a chunk
+are read back memory-mapped, so large archives are cheap to scan.
+"""
+from __future__ import absolute_import
+
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+
+from .evaluator import CARDS
+from .handstate.representation import ROUNDS
+
+__all__ = ['Writer', 'Chunk', 'chunks']
+
+# table -> tuple of (column, dtype, shape of one row)
+COLUMNS = {
+    'hand': (
+        ('button', 'int8', ()),
+        ('big_blind', 'int32', ()),
+        ('board', 'int8', (5,)),
+        ('seat_start', 'int32', ()),     # first row in the seat table
+        ('seat_count', 'int8', ()),
+        ('action_start', 'int32', ()),   # first row in the action table
+        ('action_count', 'int16', ()),
+    ),
+    'seat': (
+        ('hand', 'int32', ()),
+        ('sit', 'int8', ()),
+        ('position', 'int8', ()),
+        ('player', 'int32', ()),         # index to the player names
+        ('service', 'int32', ()),        # index to the services
+        ('in_stack', 'int32', ()),
+        ('stack', 'int32', ()),          # at the end of the hand
+        ('win', 'int32', ()),
+        ('pocket', 'int8', (2,)),
+        ('showdown', 'bool', ()),        # the pocket was shown
+    ),
+    'action': (
+        ('hand', 'int32', ()),
+        ('seat', 'int32', ()),           # row in the seat table
+        ('street', 'int8', ()),          # index to ROUNDS, posts are preflop
+        ('type', 'int8', ()),            # index to ACTIONS
+        ('amount', 'int32', ()),
+        ('error', 'int8', ()),           # index to ERRORS
+    ),
+}
+
+ACTIONS = ('small_blind', 'big_blind', 'fold', 'check', 'call', 'bet',
+           'raise', 'allin')
+ERRORS = (None, 'transport', 'impl', 'logic')
+
+# preflop bet of robopoker's Croupier
+BIG_BLIND = 20
+# hands kept in memory before they are written as a chunk
+CHUNK_HANDS = 100000
+NAMES_FILE = 'names.json'
+
+# numbers the chunks written by this process, so that the names are unique
+# even if the clock does not advance between two chunks
+_chunk_numbers = itertools.count()
+
+
+class Writer(object):
+    """
+    Appends hands to the archive.
+    The hands are written when CHUNK_HANDS of them are collected
+    and when the writer is closed.
+    """
+
+    def __init__(self, path, chunk_hands=CHUNK_HANDS):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.chunk_hands = chunk_hands
+        self.written = 0  # chunks
+        self._clear()
+
+    def _clear(self):
+        self.columns = dict((table, dict((name, []) for name, _, _ in cols))
+                            for table, cols in COLUMNS.items())
+        self.players = {}
+        self.services = {}
+
+    def append(self, state, big_blind=BIG_BLIND):
+        """
+        Adds the hand of the conducted HandState
+        """
+        hand = self.columns['hand']
+        seat = self.columns['seat']
+        action = self.columns['action']
+        index = len(hand['button'])
+        hand['button'].append(state.table.button)
+        hand['big_blind'].append(big_blind)
+        board = [card.code for card in state.community]
+        hand['board'].append(board + [-1] * (5 - len(board)))
+        hand['seat_start'].append(len(seat['hand']))
+        hand['action_start'].append(len(action['hand']))
+        shown = set(show['player'] for show in state.showdown
+                    if show['hand'])
+        rows = {}
+        for position, player in enumerate(state.table.players()):
+            rows[player.name] = len(seat['hand'])
+            service = player.transport.service
+            seat['hand'].append(index)
+            seat['sit'].append(state.table.sits.index(player))
+            seat['position'].append(position)
+            seat['player'].append(
+                self.players.setdefault(player.name, len(self.players)))
+            seat['service'].append(
+                self.services.setdefault(service, len(self.services)))
+            seat['in_stack'].append(player.initial_stack)
+            seat['stack'].append(player.stack)
+            seat['win'].append(player.win)
+            pocket = [card.code for card in player.pocket.cards]
+            seat['pocket'].append(pocket + [-1] * (2 - len(pocket)))
+            seat['showdown'].append(player.name in shown)
+        hand['seat_count'].append(len(rows))
+        acts = [(0, post['player'], post['type'], post['amount'], None)
+                for post in state.posts]
+        for street, round in enumerate(ROUNDS):
+            acts.extend((street, act['player'], act['type'], act['amount'],
+                         act['error'] and act['error'][1])
+                        for act in state.betting[round])
+        for street, player, type, amount, error in acts:
+            action['hand'].append(index)
+            action['seat'].append(rows[player])
+            action['street'].append(street)
+            action['type'].append(ACTIONS.index(type))
+            action['amount'].append(amount)
+            action['error'].append(ERRORS.index(error))
+        hand['action_count'].append(len(acts))
+        if index + 1 >= self.chunk_hands:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the collected hands as a new chunk
+        """
+        if not self.columns['hand']['button']:
+            return
+        # microseconds first, so that the names sort in the order the
+        # chunks were written, also across processes
+        name = 'chunk-%016d-%d-%06d' % (int(time.time() * 1000000),
+                                       os.getpid(), next(_chunk_numbers))
+        tmp = os.path.join(self.path, '.' + name)
+        os.mkdir(tmp)
+        for table, cols in COLUMNS.items():
+            for column, dtype, shape in cols:
+                data = np.array(self.columns[table][column], dtype=dtype)
+                data = data.reshape((-1,) + shape)
+                np.save(os.path.join(tmp, '%s.%s.npy' % (table, column)),
+                        data)
+        names = {
+            'players': sorted(self.players, key=self.players.get),
+            'services': sorted(self.services, key=self.services.get),
+        }
+        with open(os.path.join(tmp, NAMES_FILE), 'w') as f:
+            json.dump(names, f)
+        os.rename(tmp, os.path.join(self.path, name))
+        self.written += 1
+        self._clear()
+
+    def close(self):
+        self.flush()
+
+
+class Chunk(object):
+    """
+    Hands of one chunk, columns are memory-mapped on first use:
+    chunk['seat.stack'], chunk['hand.board'], ...
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, NAMES_FILE)) as f:
+            names = json.load(f)
+        self.players = names['players']
+        self.services = names['services']
+        self._columns = {}
+
+    def __getitem__(self, column):
+        if column not in self._columns:
+            self._columns[column] = np.load(
+                os.path.join(self.path, column + '.npy'), mmap_mode='r')
+        return self._columns[column]
+
+    def __len__(self):
+        return len(self['hand.button'])
+
+    def hand(self, index):
+        """
+        Returns the hand as a dict, like:
+        {'button': 0, 'big_blind': 20, 'board': ['KS', '9D', 'AS'],
+         'seats': [{'name': 'kari', 'service': 'smart', 'sit': 3, ...}],
+         'actions': [('preflop', 'kari', 'small_blind', 10, None), ...]}
+        """
+        seat_start = int(self['hand.seat_start'][index])
+        seats = []
+        for row in range(seat_start,
+                         seat_start + int(self['hand.seat_count'][index])):
+            seats.append({
+                'name': self.players[self['seat.player'][row]],
+                'service': self.services[self['seat.service'][row]],
+                'sit': int(self['seat.sit'][row]),
+                'in_stack': int(self['seat.in_stack'][row]),
+                'stack': int(self['seat.stack'][row]),
+                'win': int(self['seat.win'][row]),
+                'pocket': cards(self['seat.pocket'][row]),
+                'showdown': bool(self['seat.showdown'][row]),
+            })
+        start = int(self['hand.action_start'][index])
+        actions = []
+        for row in range(start,
+                         start + int(self['hand.action_count'][index])):
+            actions.append((
+                ROUNDS[self['action.street'][row]],
+                seats[self['action.seat'][row] - seat_start]['name'],
+                ACTIONS[self['action.type'][row]],
+                int(self['action.amount'][row]),
+                ERRORS[self['action.error'][row]],
+            ))
+        return {
+            'button': int(self['hand.button'][index]),
+            'big_blind': int(self['hand.big_blind'][index]),
+            'board': cards(self['hand.board'][index]),
+            'seats': seats,
+            'actions': actions,
+        }
+
+
+def cards(codes):
+    """
+    Card strings of the codes, without the missing ones
+    """
+    return [CARDS[code] for code in codes if code >= 0]
+
+
+def chunks(path):
+    """
+    Returns the complete chunks of the archive in the order they were written
+    """
+    if not os.path.isdir(path):
+        return []
+    names = sorted(name for name in os.listdir(path)
+                   if name.startswith('chunk-'))
+    return [Chunk(os.path.join(path, name)) for name in names]
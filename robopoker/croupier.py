@@ -2,13 +2,19 @@ from __future__ import absolute_import
 
 import sys
 import re
+import Queue
 from math import floor
+from multiprocessing.pool import ThreadPool
 from operator import attrgetter
 
 from .entities import CardSet
 from . import dictionary
 from . import transport
 from .handstate.representation import dump as dump_handstate
+from .handstate import compact
+
+# the answers of the bots that are actions
+ACTION_RE = re.compile('fold|check|call|bet|raise|allin')
 
 class Croupier(object):
 
@@ -28,6 +34,18 @@ class Croupier(object):
         )
 
     def conduct(self):
+        """
+        Plays the hand asking the players one after another
+        """
+        for request in self.play():
+            request.ask()
+
+    def play(self):
+        """
+        Plays the hand.
+        Generates Request for every player's turn and continues
+        when the request is answered (see conduct and conduct_all)
+        """
         self.deal_pockets()
         for i, (round, draw, bet) in enumerate(self.structure):
             self._log('%-10s  ' % str(round).upper(), False)
@@ -37,7 +55,9 @@ class Croupier(object):
             posts = ()
             if not i and self.posts:
                 posts = self.posts
-            pots = self.betting_round(round, min_bet=bet, posts=posts)
+            pots = []
+            for request in self.betting_round(round, bet, posts, pots):
+                yield request
             self.pots = self.pots[:-1] + [self.pots[-1] + pots[0]] + pots[1:]
             self._log(('POTS', self.pots))
         self._log('SHOWDOWN')
@@ -68,20 +88,30 @@ class Croupier(object):
         self.state.deck.draw()
         for deal in range(0, count):
             draw = self.state.deck.draw()
-            self.state.community.append(draw)
+            self.state.add_community(draw)
             self._log(draw, False)
 
+    def public_state(self, player):
+        """
+        State of the hand as it is sent to the player,
+        in the format of his transport
+        """
+        if player.transport.format == 'json':
+            return compact.dump(self.state)
+        return dump_handstate(self.state)
+
     def parse_response(self, r):
         r = str(r).strip()
-        if not re.match('fold|check|call|bet|raise|allin', r):
+        if not ACTION_RE.match(r):
             return None
         return r
 
-    def betting_round(self, round, min_bet, posts):
+    def betting_round(self, round, min_bet, posts, pots):
         """
         Plays one full betting round.
         Optional process live blind posts.
-        Returns pot.
+        Generates Request for every player's turn
+        and fills the pots list at the end.
         """
         full_loops = 0
         cur_bet = 0
@@ -116,7 +146,8 @@ class Croupier(object):
                 # After the first iteration
                 # we have to check that round not closed
                 if self.round_closed(players, cur_bet):
-                    return self.collect_pots(players)
+                    pots.extend(self.collect_pots(players))
+                    return
                 # Folded or all-in player not really in game.
                 # Just skip him
                 if player.folded or player.allin:
@@ -126,11 +157,12 @@ class Croupier(object):
                 # TODO: determine possible amounts for each act
                 possible = self.possible_actions(player, players, cur_bet, min_bet)
                 error = None
-                try:
-                    response = player.message(possible.keys(), dump_handstate(self.state))
-                except transport.Error as e:
-                    error = (str(e), 'transport')
-                    self._log('ERROR: transport error ' + str(e))
+                request = Request(player, possible.keys(), self.public_state(player))
+                yield request
+                response = request.response
+                if request.error is not None:
+                    error = (str(request.error), 'transport')
+                    self._log('ERROR: transport error ' + str(request.error))
                     response = 'fold'
                 act = self.parse_response(response)
                 # Now, act is just a keyword like "call" or "fold".
@@ -286,9 +318,10 @@ class Croupier(object):
                 by_stack.append([player])
             else:
                 last_group.append(player)
-        # Regroup by pot
+        # Regroup by pot.
+        # Pots are identified by index, several pots may hold the same amount
         by_pot = {}
-        pots = self.pots[:]
+        pots = range(len(self.pots))
         last_pot = None
         while True:
             if not pots:
@@ -299,14 +332,14 @@ class Croupier(object):
             # Richest players goes to the last group
             by_pot[last_pot].extend(group)
 
-        for pot in reversed(self.pots):
+        for pot in reversed(range(len(self.pots))):
             by_pot[pot] = self.determine_winners(by_pot[pot])
 
         absolute_winners = self.determine_winners(contenders)
 
         senior_winners = set()  # absolute winners of the senior pot
         pots_closing_index = None  # reversed index of last side pot with known winner
-        for i, pot in enumerate(reversed(self.pots)):
+        for i, pot in enumerate(reversed(range(len(self.pots)))):
             pot_winners = by_pot[pot]
             absolute_pot_winners = ((set(pot_winners) & set(absolute_winners)) |
                                                                 senior_winners)
@@ -314,7 +347,7 @@ class Croupier(object):
                 if pots_closing_index is None:
                     pots_closing_index = i
                 senior_winners |= absolute_pot_winners
-                amount = int(floor(pot / len(absolute_pot_winners)))
+                amount = int(floor(self.pots[pot] / len(absolute_pot_winners)))
                 for winner in absolute_pot_winners:
                     winner.win += amount
         # Now we have to drop already processed pots
@@ -328,15 +361,17 @@ class Croupier(object):
     def determine_winners(self, contenders):
         if len(contenders) == 1:
             return contenders
+        # every pot asks again, rate every hand only once
+        for player in contenders:
+            if player.hand is None:
+                player.hand = self.player_hand(player)
         aggressor = contenders[0]
-        aggressor.hand = self.player_hand(aggressor)
         winners = [aggressor]
-        winner_hand = aggressor.hand
+        winner_score = aggressor.hand.score
         for player in contenders[1:]:
-            player.hand = self.player_hand(player)
-            if winner_hand < player.hand:
-                winners, winner_hand = [player], player.hand
-            elif winner_hand == player.hand:
+            if winner_score < player.hand.score:
+                winners, winner_score = [player], player.hand.score
+            elif winner_score == player.hand.score:
                 winners.append(player)
         return winners
 
@@ -368,3 +403,76 @@ class Croupier(object):
         if nl:
             s += '\n'
         self.log_file.write(str(s))
+
+
+class Request(object):
+    """
+    Player's turn to act.
+    Croupier.play waits until it is answered.
+    """
+
+    def __init__(self, player, actions, state):
+        self.player = player
+        self.actions = actions
+        self.state = state
+        self.response = None
+        self.error = None     # transport.Error
+        self.exc_info = None  # any other exception, set by conduct_all
+
+    def ask(self):
+        try:
+            self.response = self.player.message(self.actions, self.state)
+        except transport.Error as e:
+            self.error = e
+
+
+def conduct_all(croupiers, threads=None):
+    """
+    Plays the hands of several tables at once.
+    The players are asked in a pool of threads, so a slow bot holds up
+    only its own table. The croupiers themselves run in this thread
+    and each of them plays just like conduct does.
+    A table waits for at most one player at a time, so by default
+    there is a thread per table and all the tables can wait at once.
+    With `threads` set, at most that many players are asked at once
+    and the other tables wait for a free thread. Every thread takes
+    a stack (8 MB of address space by default), which limits the
+    number of tables played by one process.
+    """
+    if threads is None:
+        threads = len(croupiers)
+    pool = ThreadPool(max(1, min(threads, len(croupiers))))
+    answered = Queue.Queue()
+    playing = 0
+    try:
+        for croupier in croupiers:
+            playing += _next_request(croupier.play(), pool, answered)
+        while playing:
+            hand, request = answered.get()
+            if request.exc_info:
+                raise request.exc_info[0], request.exc_info[1], request.exc_info[2]
+            playing += _next_request(hand, pool, answered) - 1
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _next_request(hand, pool, answered):
+    """
+    Plays the hand until the next request and sends it to the pool.
+    Returns 0 if the hand is over.
+    """
+    try:
+        request = next(hand)
+    except StopIteration:
+        return 0
+    pool.apply_async(_ask, (hand, request, answered))
+    return 1
+
+
+def _ask(hand, request, answered):
+    try:
+        request.ask()
+    except Exception:
+        request.exc_info = sys.exc_info()
+    answered.put((hand, request))
@@ -1,5 +1,5 @@
 import random
-from robopoker import combinations, dictionary, shuffler
+from robopoker import combinations, dictionary, evaluator, shuffler
 
 __all__ = ['Card', 'Deck', 'CardSet', 'Player', 'Table']
 
@@ -9,38 +9,62 @@ class CardException(Exception):
 
 
 class Card(object):
-
-    def __init__(self, rank, suit):
-        self.rank = rank
-        self.suit = suit
-        if self.rank not in combinations.RANKS:
-            raise CardException("Invalid rank: %s" % self.rank)
-        if self.suit not in ['S', 'D', 'H', 'C']:
-            raise CardException("Invalid suit: %s" % self.suit)
+    """
+    There is exactly one instance of every card:
+    Card('A', 'S') is Card('A', 'S')
+    Besides rank and suit it has the evaluator code
+    and numeric value of the rank (2..14)
+    """
+    __slots__ = ('rank', 'suit', 'code', 'value')
+
+    def __new__(cls, rank, suit):
+        try:
+            return _CARDS[rank + suit]
+        except (KeyError, TypeError):
+            pass
+        if rank not in dictionary.RANK_NAME:
+            raise CardException("Invalid rank: %s" % rank)
+        raise CardException("Invalid suit: %s" % suit)
 
     def __repr__(self):
         return self.rank + self.suit
 
+    def __reduce__(self):
+        return Card, (self.rank, self.suit)
+
+    def __hash__(self):
+        return self.code
+
     def __cmp__(self, other):
-        if self.rank == other.rank and self.suit == other.suit:
+        if self is other:
             return 0
-        index = combinations.RANKS.index(self.rank)
-        other_index = combinations.RANKS.index(other.rank)
-        if index < other_index:
+        if self.value < other.value:
             return -1
         else:
             return 1
 
 
+def _create_cards():
+    cards = {}
+    for code, name in enumerate(evaluator.CARDS):
+        card = object.__new__(Card)
+        card.rank, card.suit = name
+        card.code = code
+        card.value = combinations.RANKS.index(card.rank)
+        cards[name] = card
+    return cards
+
+_CARDS = _create_cards()
+
+# All cards ordered by code
+CARDS = sorted(_CARDS.values(), key=lambda c: c.code)
+
+
 class Deck(object):
 
     def __init__(self, cards=None):
         if not cards:
-            cards = [
-                Card(r, s)
-                for r in dictionary.RANK_NAME.keys()
-                    for s in dictionary.SUIT_NAME.keys()
-            ]
+            cards = list(CARDS)
         self.cards = cards
 
     def draw(self):
@@ -54,21 +78,31 @@ class CardSet(object):
 
     def __init__(self, cards=None):
         self.cards = []
+        self.mask = 0  # bit per card code
+        self.score = None
         self.base = None
         self.kickers = []
         if cards:
-            map(self.add, cards)
+            self.cards.extend(cards)
+            for card in cards:
+                self.mask |= 1 << card.code
 
     def add(self, card):
         self.cards.append(card)
+        self.mask |= 1 << card.code
+
+    def codes(self):
+        return [c.code for c in self.cards]
 
     def rate(self):
-        hand = [repr(c) for c in self.cards]
-        self.base, self.kickers = combinations.rate_hand(hand)
+        self.score = evaluator.rate(self.codes())
+        self.base, self.kickers = evaluator.unpack(self.score)
+
+    def __contains__(self, card):
+        return bool(self.mask & 1 << card.code)
 
     def __cmp__(self, other):
-        return cmp(self.base, other.base) \
-            or combinations.cmp_rate(self.kickers, other.kickers)
+        return cmp(self.score, other.score)
 
     def __repr__(self):
         """
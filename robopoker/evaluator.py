@@ -0,0 +1,397 @@
+"""
+Table-driven hand evaluator.
+
+Cards are encoded as small integers:
+    code = rank_index * 4 + suit_index
+where rank_index is 0 for deuce .. 12 for ace and suit_index is the
+position of the suit in SUITS. A 5..7 card hand is ranked with two
+lookups: a flush table indexed by the 13-bit rank mask of the flush suit
+and a rank table indexed by the sum of per-rank "face keys" (the sum is
+unique for every rank multiset of a given size).
+
+The result is a single integer score, greater is better. Scores are
+packed as
+    base << 20 | kicker_1 << 16 | kicker_2 << 12 | ...
+so `unpack` gives back the same (base, kickers) pair that
+`combinations.rate_hand` returns.
+
+The tables are generated once per host into a versioned binary file
+(TABLES_PATH, or the path in the ROBOPOKER_TABLES environment variable)
+and memory-mapped read-only, so all processes on the machine share them.
+The 7 card rank table is dense, indexed directly by the face key sum; the
+5 and 6 card tables are sorted (key, score) arrays.
+"""
+import itertools
+import logging
+import os
+import struct
+
+LOG = logging.getLogger("robopoker")
+
+RANK_CHARS = '23456789TJQKA'
+SUITS = 'SHDC'
+
+# The sum of these keys is distinct for every multiset of ranks
+# of one size (at most 4 cards of a rank, up to 7 cards)
+FACE_KEYS = (0, 1, 5, 22, 98, 453, 2031, 8698, 22854, 83661, 262349, 636345,
+             1479181)
+
+# Number of kickers for every combination id
+KICKERS = (5, 4, 3, 3, 1, 5, 2, 2, 1)
+
+CARDS = [r + s for r in RANK_CHARS for s in SUITS]
+CODES = dict((card, code) for code, card in enumerate(CARDS))
+
+_FACE = [FACE_KEYS[code >> 2] for code in range(52)]
+_BIT = [1 << (code >> 2) for code in range(52)]
+
+TABLES_VERSION = 1
+TABLES_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'robopoker',
+                           'evaluator-%d.bin' % TABLES_VERSION)
+TABLES_MAGIC = 'RPEVAL\0\0'
+# magic, version, sizes of the flush, 7 card, 5 card and 6 card tables
+TABLES_HEADER = struct.Struct('<8sIIIII')
+# the greatest face key sum of 7 cards: four aces and three kings
+MAX_KEY_7 = 4 * FACE_KEYS[12] + 3 * FACE_KEYS[11]
+
+_FLUSH = None   # rank mask -> score, 0 for less than 5 cards
+_RANKED = None  # hand size -> {face key sum: score}, or the dense 7 card
+                # table indexed by the key sum
+_LOOKUP = None  # hand size -> function of face key sum returning the score
+_MAPPED = None  # the memory-mapped tables file, see load_tables
+_ARRAYS = None  # the tables as numpy arrays, for rate_many
+FLUSH_SHIFTS = (0, 3, 6, 9)  # of the suit counts in rate_many
+
+
+def encode(card):
+    """
+    Card string like 'AS' -> card code
+    """
+    return CODES[card]
+
+
+def decode(code):
+    return CARDS[code]
+
+
+def rate(codes):
+    """
+    Returns score of a 5..7 card hand given as card codes
+    """
+    if _FLUSH is None:
+        build_tables()
+    key = 0
+    masks = [0, 0, 0, 0]
+    for c in codes:
+        key += _FACE[c]
+        masks[c & 3] |= _BIT[c]
+    for mask in masks:
+        score = _FLUSH[mask]
+        if score:
+            return score
+    return _LOOKUP[len(codes)](key)
+
+
+def rate_many(hands):
+    """
+    Returns scores of many hands at once.
+    `hands` is an integer array of card codes with one hand of 5..7 cards
+    per row, the result is an array with one score per row.
+    """
+    import numpy
+    if _ARRAYS is None:
+        build_arrays()
+    face, bit, flush, ranked = _ARRAYS
+    hands = numpy.asarray(hands)
+    sums = face[hands].sum(axis=1)
+    if hands.shape[1] == 7:
+        scores = ranked[7][sums]
+    else:
+        keys, scores = ranked[hands.shape[1]]
+        scores = scores[numpy.searchsorted(keys, sums)]
+    suits = hands & 3
+    # Cards of every suit counted in 3 bits, only the rows with 5 or more
+    # of one suit need the flush table
+    counts = numpy.left_shift(1, 3 * suits).sum(axis=1)
+    flushes = (counts[:, numpy.newaxis] >> FLUSH_SHIFTS) & 7 >= 5
+    rows = numpy.nonzero(flushes.any(axis=1))[0]
+    if len(rows):
+        suit = flushes[rows].argmax(axis=1)
+        # Cards are unique, so the sum of rank bits is their union
+        mask = numpy.where(suits[rows] == suit[:, numpy.newaxis],
+                           bit[hands[rows]], 0).sum(axis=1)
+        # What is indexed from the mapped tables is read-only
+        scores = numpy.array(scores)
+        scores[rows] = numpy.maximum(scores[rows], flush[mask])
+    return scores
+
+
+def rate_hand(hand):
+    """
+    Drop-in replacement for combinations.rate_hand
+    """
+    return unpack(rate([CODES[card] for card in hand]))
+
+
+def pack(base, kickers):
+    score = base << 20
+    shift = 16
+    for k in kickers:
+        score |= k << shift
+        shift -= 4
+    return score
+
+
+def unpack(score):
+    base = score >> 20
+    kickers = []
+    shift = 16
+    for i in range(KICKERS[base]):
+        kickers.append((score >> shift) & 0xF)
+        shift -= 4
+    return base, kickers
+
+
+def straight_top(mask):
+    """
+    Returns the value of the highest card of the best straight
+    in the rank mask or None
+    """
+    for top in range(12, 3, -1):
+        window = 0x1F << (top - 4)
+        if mask & window == window:
+            return top + 2
+    # Five high straight, the ace plays as one
+    if mask & 0x100F == 0x100F:
+        return 5
+    return None
+
+
+def build_tables():
+    """
+    Loads the tables from the tables file, generates the file first
+    if it does not exist yet. If it cannot be written, the tables
+    are only generated in memory.
+    """
+    global _FLUSH, _RANKED, _LOOKUP, _MAPPED
+    path = tables_path()
+    try:
+        arrays = load_tables(path)
+    except (IOError, ValueError, ImportError):
+        arrays = None
+    if arrays is None:
+        LOG.warning('generating the evaluator tables into %s, set '
+                    'ROBOPOKER_TABLES to keep them elsewhere', path)
+        flush, ranked = generate_tables()
+        try:
+            write_tables(path, flush, ranked)
+            arrays = load_tables(path)
+        except (IOError, OSError, ImportError) as e:
+            LOG.warning('cannot write the evaluator tables, they are kept '
+                        'in memory only: %s', e)
+            _FLUSH, _RANKED = flush, ranked
+            _LOOKUP = dict((size, table.__getitem__)
+                           for size, table in ranked.items())
+            return
+    _MAPPED = arrays
+    flush, ranked_7, ranked_5, ranked_6 = arrays
+    _FLUSH = flush.tolist()
+    _RANKED = {
+        5: dict(zip(*[column.tolist() for column in ranked_5])),
+        6: dict(zip(*[column.tolist() for column in ranked_6])),
+        7: ranked_7,
+    }
+    _LOOKUP = {
+        5: _RANKED[5].__getitem__,
+        6: _RANKED[6].__getitem__,
+        # item returns a python int, faster than indexing
+        7: ranked_7.item,
+    }
+
+
+def tables_path():
+    return os.environ.get('ROBOPOKER_TABLES') or TABLES_PATH
+
+
+def generate_tables():
+    """
+    Returns the flush table (list) and the rank tables
+    (dict of hand size -> {face key sum: score})
+    """
+    flush = [0] * 8192
+    for mask in range(8192):
+        if bin(mask).count('1') < 5:
+            continue
+        top = straight_top(mask)
+        if top:
+            flush[mask] = pack(8, [top])
+        else:
+            vals = [r + 2 for r in range(12, -1, -1) if mask & (1 << r)]
+            flush[mask] = pack(5, vals[:5])
+    ranked = {}
+    for size in (5, 6, 7):
+        table = ranked[size] = {}
+        for ranks in itertools.combinations_with_replacement(range(13), size):
+            counts = [0] * 13
+            for r in ranks:
+                counts[r] += 1
+            if max(counts) > 4:
+                continue
+            table[sum(FACE_KEYS[r] for r in ranks)] = _rate_counts(counts)
+    return flush, ranked
+
+
+def write_tables(path, flush, ranked):
+    """
+    Writes the tables file. It is written under a temporary name
+    and renamed, so other processes never see a partial file.
+    """
+    import numpy
+    dense = numpy.zeros(MAX_KEY_7 + 1, dtype=numpy.int32)
+    dense[sorted(ranked[7])] = [ranked[7][k] for k in sorted(ranked[7])]
+    sections = [numpy.array(flush, dtype=numpy.int32), dense]
+    for size in (5, 6):
+        keys = sorted(ranked[size])
+        sections.append(numpy.array(keys, dtype=numpy.int32))
+        sections.append(numpy.array([ranked[size][k] for k in keys],
+                                    dtype=numpy.int32))
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(TABLES_HEADER.pack(TABLES_MAGIC, TABLES_VERSION, len(flush),
+                                   len(dense), len(ranked[5]),
+                                   len(ranked[6])))
+        for section in sections:
+            f.write(section.tobytes())
+    os.rename(tmp, path)
+
+
+def load_tables(path):
+    """
+    Memory-maps the tables file.
+    Returns the flush table, the dense 7 card table and (keys, scores)
+    of the 5 and 6 card tables as read-only arrays, or None if the file
+    does not exist or has another version.
+    """
+    import numpy
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        header = f.read(TABLES_HEADER.size)
+    if len(header) < TABLES_HEADER.size:
+        return None
+    magic, version, flush_size, size_7, size_5, size_6 = \
+        TABLES_HEADER.unpack(header)
+    if magic != TABLES_MAGIC or version != TABLES_VERSION:
+        return None
+    data = numpy.memmap(path, dtype=numpy.int32, mode='r',
+                        offset=TABLES_HEADER.size)
+    sections = []
+    start = 0
+    for size in (flush_size, size_7, size_5, size_5, size_6, size_6):
+        sections.append(data[start:start + size])
+        start += size
+    if start != len(data):
+        raise ValueError('corrupted tables file %s' % path)
+    return (sections[0], sections[1], (sections[2], sections[3]),
+            (sections[4], sections[5]))
+
+
+def build_arrays():
+    global _ARRAYS
+    import numpy
+    if _FLUSH is None:
+        build_tables()
+    if _MAPPED is not None:
+        ranked = {7: _MAPPED[1], 5: _MAPPED[2], 6: _MAPPED[3]}
+    else:
+        # the tables file could not be written
+        ranked = {}
+        for size in (5, 6):
+            table = _RANKED[size]
+            keys = numpy.array(sorted(table), dtype=numpy.int32)
+            scores = numpy.array([table[k] for k in keys], dtype=numpy.int32)
+            ranked[size] = (keys, scores)
+        table = _RANKED[7]
+        ranked[7] = numpy.zeros(MAX_KEY_7 + 1, dtype=numpy.int32)
+        ranked[7][sorted(table)] = [table[k] for k in sorted(table)]
+    _ARRAYS = (numpy.array(_FACE, dtype=numpy.int32),
+               numpy.array(_BIT, dtype=numpy.int32),
+               numpy.array(_FLUSH, dtype=numpy.int32),
+               ranked)
+
+
+def _rate_counts(counts):
+    """
+    Score of a hand without a flush, given the number of cards of every rank
+    """
+    by_count = {1: [], 2: [], 3: [], 4: []}
+    mask = 0
+    for r in range(12, -1, -1):
+        if counts[r]:
+            by_count[counts[r]].append(r + 2)
+            mask |= 1 << r
+    quads, sets, pairs = by_count[4], by_count[3], by_count[2]
+    # Every rank present, best first
+    vals = [r + 2 for r in range(12, -1, -1) if counts[r]]
+    if quads:
+        return pack(7, [quads[0]] + [v for v in vals if v != quads[0]][:1])
+    if sets and (len(sets) > 1 or pairs):
+        return pack(6, [sets[0], max(sets[1:] + pairs)])
+    top = straight_top(mask)
+    if top:
+        return pack(4, [top])
+    if sets:
+        return pack(3, sets[:1] + by_count[1][:2])
+    if len(pairs) >= 2:
+        rest = [v for v in vals if v not in pairs[:2]]
+        return pack(2, pairs[:2] + rest[:1])
+    if pairs:
+        return pack(1, pairs + by_count[1][:3])
+    return pack(0, by_count[1][:5])
+
+
+if __name__ == '__main__':
+    import random
+    import sys
+    import combinations
+
+    def reference(hand):
+        # combinations.rate_hand is exact for 5 card hands only,
+        # so bigger hands are rated as the best 5 card subset
+        return max(combinations.rate_hand(list(sub))
+                   for sub in itertools.combinations(hand, 5))
+
+    def check_all_five():
+        errors = 0
+        for hand in itertools.combinations(CARDS, 5):
+            expected = combinations.rate_hand(list(hand))
+            actual = rate_hand(hand)
+            if (actual[0], actual[1]) != expected:
+                errors += 1
+                print '%-20s expected %s got %s' % (' '.join(hand),
+                                                    expected, actual)
+        return errors
+
+    def check_sample(size, count):
+        errors = 0
+        for i in range(count):
+            hand = random.sample(CARDS, size)
+            expected = reference(hand)
+            actual = rate_hand(hand)
+            if (actual[0], actual[1]) != expected:
+                errors += 1
+                print '%-20s expected %s got %s' % (' '.join(hand),
+                                                    expected, actual)
+        return errors
+
+    random.seed(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    failed = check_all_five()
+    print 'all 5 card hands: %d errors' % failed
+    for size in (6, 7):
+        errors = check_sample(size, 100000)
+        print '100000 random %d card hands: %d errors' % (size, errors)
+        failed += errors
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,43 @@
+"""
+Compact JSON encoding of the public hand state.
+
+It carries the same information as the public XML of representation.dump
+in lists instead of elements:
+
+    {"button": 1,
+     "players": [[name, sit, in_stack, stack], ...],
+     "posts": [[player, type, amount], ...],
+     "betting": [[[player, type, amount], ...],  # preflop
+                 ...],                           # flop, turn, river
+     "community": ["QC", "8C", "3S"],
+     "showdown": [[player, win, "7D AC" or null], ...]}
+
+Showdown is present only after the hand is over.
+"""
+from __future__ import absolute_import
+
+import json
+
+from .representation import ROUNDS
+
+__all__ = ['dump']
+
+
+def dump(state):
+    table = state.table
+    data = {
+        'button': table.button,
+        'players': [[table.sits[k].name, k, table.sits[k].initial_stack,
+                     table.sits[k].stack] for k in table.occupied_sits()],
+        'posts': [[post['player'], post['type'], post['amount']]
+                  for post in state.posts],
+        'betting': [[[act['player'], act['type'], act['amount']]
+                     for act in state.betting[round]] for round in ROUNDS],
+        'community': [repr(card) for card in state.community],
+    }
+    if state.showdown:
+        data['showdown'] = [
+            [show['player'], show['win'],
+             repr(show['hand']) if show['hand'] else None]
+            for show in state.showdown]
+    return json.dumps(data, separators=(',', ':'))
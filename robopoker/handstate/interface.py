@@ -7,6 +7,7 @@ class HandState(object):
         self.posts = []
         self.betting = {'preflop': [], 'flop': [], 'turn': [], 'river': []}
         self.showdown = []
+        self.document = None  # live public XML, see representation.dump
 
     def add_post(self, player, amount, type):
         self.posts.append({
@@ -15,6 +16,9 @@ class HandState(object):
             'type': type
         })
 
+    def add_community(self, card):
+        self.community.append(card)
+
     def add_action(self, round, player, type, amount=0, error=None):
         data = {
             'player': player.name,
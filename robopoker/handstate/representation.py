@@ -10,8 +10,12 @@ from . import interface
 
 __all__ = ['dump', 'open', 'parse', 'echo', 'to_public']
 
+ROUNDS = ('preflop', 'flop', 'turn', 'river')
 
-def dump(state, public=True, pretty=True):
+
+def dump(state, public=True, pretty=False):
+    if public:
+        return echo(public_document(state).update(), pretty)
     root = ET.Element('game')
     appendNotEmpty(root, dump_table(state.table))
     appendNotEmpty(root, dump_posts(state.posts))
@@ -19,14 +23,11 @@ def dump(state, public=True, pretty=True):
     appendNotEmpty(root, dump_community(state.community))
     if state.showdown:
         appendNotEmpty(root, dump_showdown(state.showdown))
-    if not public:
-        appendNotEmpty(root, dump_deck(state.deck))
-    if public:
-        root = to_public(root)
+    appendNotEmpty(root, dump_deck(state.deck))
     return echo(root, pretty)
 
 
-def echo(root, pretty=True):
+def echo(root, pretty=False):
     s = StringIO()
     ET.ElementTree(root).write(s)
     if pretty:
@@ -53,6 +54,87 @@ def to_public(root, player=None):
     return root
 
 
+def public_document(state):
+    """
+    Returns the live public document of the hand, created at first use
+    """
+    if state.document is None:
+        state.document = PublicDocument(state)
+    return state.document
+
+
+class PublicDocument(object):
+    """
+    Public XML of the hand, the same that to_public makes of the full dump.
+    It is kept between dumps and every update appends just the posts,
+    actions, community cards and showdowns added to the state since
+    the previous one, so dumping the state for every action does not
+    rebuild the whole history.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self.root = ET.Element('game')
+        table = state.table
+        table_el = ET.SubElement(self.root, 'table',
+                                 {'button': str(table.button)})
+        self.players = []
+        for k in table.occupied_sits():
+            player = table.sits[k]
+            attrs = {
+                'name': player.name,
+                'in_stack': str(player.initial_stack),
+                'stack': str(player.stack),
+                'sit': str(k)
+            }
+            self.players.append(
+                (player, ET.SubElement(table_el, 'player', attrs)))
+        self.posts = None
+        betting = ET.SubElement(self.root, 'betting')
+        self.rounds = {}
+        for round in ROUNDS:
+            self.rounds[round] = ET.SubElement(betting, 'round',
+                                               {'name': round})
+        self.community = ET.SubElement(self.root, 'community')
+        self.showdown = None
+
+    def update(self):
+        """
+        Brings the document up to date and returns its root
+        """
+        state = self.state
+        for player, el in self.players:
+            el.set('stack', str(player.stack))
+        if state.posts:
+            if self.posts is None:
+                self.posts = ET.Element('posts')
+                # posts go right after the table
+                self.root.insert(1, self.posts)
+            for post in state.posts[len(self.posts):]:
+                ET.SubElement(self.posts, 'post', {
+                    'player': post['player'],
+                    'amount': str(post['amount']),
+                    'type': post['type']
+                })
+        for round in ROUNDS:
+            round_el = self.rounds[round]
+            for act in state.betting[round][len(round_el):]:
+                # errors are private
+                ET.SubElement(round_el, 'action', {
+                    'player': act['player'],
+                    'type': act['type'],
+                    'amount': str(act['amount'])
+                })
+        for card in state.community[len(self.community):]:
+            self.community.append(dump_card(card))
+        if state.showdown:
+            if self.showdown is None:
+                self.showdown = ET.SubElement(self.root, 'showdown')
+            for show in state.showdown[len(self.showdown):]:
+                self.showdown.append(dump_show(show))
+        return self.root
+
+
 def dump_posts(posts):
     if not posts:
         return
@@ -69,7 +151,7 @@ def dump_posts(posts):
 
 def dump_betting(betting):
     root = ET.Element('betting')
-    for round in ('preflop', 'flop', 'turn', 'river'):
+    for round in ROUNDS:
         actions = betting[round]
         sub = ET.SubElement(root, 'round', {'name': round})
         for act in actions:
@@ -126,15 +208,20 @@ def dump_showdown(showdown):
         return
     root = ET.Element('showdown')
     for show in showdown:
-        sub = ET.SubElement(root, 'player',
-            {
-                'name': show['player'],
-                'win': str(show['win'])
-            })
-        if show['hand']:
-            hand = ET.SubElement(sub, 'hand')
-            for card in show['hand'].cards:
-                hand.append(dump_card(card))
+        root.append(dump_show(show))
+    return root
+
+
+def dump_show(show):
+    root = ET.Element('player',
+        {
+            'name': show['player'],
+            'win': str(show['win'])
+        })
+    if show['hand']:
+        hand = ET.SubElement(root, 'hand')
+        for card in show['hand'].cards:
+            hand.append(dump_card(card))
     return root
 
 
@@ -1,65 +1,391 @@
 from subprocess import Popen, PIPE, STDOUT
 from urllib import urlencode
-from urllib2 import urlopen, URLError
+import atexit
+import errno
+import fcntl
+import httplib
+import importlib
+import os
+import random
+import select
 import socket
+import threading
+import time
+import urlparse
+
+
+# Encodings of the hand state sent to the bots
+FORMATS = ('xml', 'json')
 
 
 def create(type, service):
+    """
+    Type may end with the state format, e.g. "http+json",
+    XML is sent by default
+    """
     socket.setdefaulttimeout(HTTP.TIMEOUT + 2)
-    return {'local': Local, 'http': HTTP}[type](service)
+    type, _, format = type.partition('+')
+    return {
+        'local': Local,
+        'worker': Worker,
+        'http': HTTP,
+        'python': Python
+    }[type](service, format or 'xml')
+
+
+def format_request(name, pocket, actions, state):
+    """
+    Request text of the local transports
+    """
+    lines = [name, pocket, ''] + list(actions) + ['', state]
+    return '\n'.join(lines)
 
 
 class Abstract(object):
-    def __init__(self, service):
+    def __init__(self, service, format='xml'):
+        if format not in FORMATS:
+            raise Error('unknown state format %s' % format)
         self.service = service
+        self.format = format
 
     def message(self, name, pocket, actions, state):
         raise Exception('Abstract method called')
 
     def type(self):
-        return str(self.__class__.__name__).lower()
+        type = str(self.__class__.__name__).lower()
+        if self.format != 'xml':
+            type += '+' + self.format
+        return type
 
 
 class Local(Abstract):
     def message(self, name, pocket, actions, state):
         p = Popen(self.service, stdin=PIPE, stdout=PIPE,
                 stderr=STDOUT, universal_newlines=True, shell=True)
-        w = p.stdin.write
-        w(name + "\n")
-        w(pocket + "\n")
-        w("\n")
-        for a in actions:
-            w(a + "\n")
-        w("\n")
-        w(state)
+        p.stdin.write(format_request(name, pocket, actions, state))
         p.stdin.flush()
         p.stdin.close()
         return p.stdout.read().strip()
 
 
-class HTTP(Abstract):
+class Worker(Abstract):
+    """
+    Keeps the bot command running for the whole game
+    and sends it one request per action through its stdin.
+    Requests and responses are framed as the payload length,
+    newline and the payload. The request payload is the same
+    text that Local writes. The bot is restarted if it crashes
+    and killed if it does not answer in time (including the time
+    to write the request, a hung bot may stop reading it).
+    """
 
     TIMEOUT = 5
+
+    running = []  # all started workers, stopped at exit
+
+    def __init__(self, service, format='xml'):
+        super(Worker, self).__init__(service, format)
+        self.process = None
+
+    def start(self):
+        # exec, so that killing the shell kills the bot
+        self.process = Popen('exec ' + self.service, stdin=PIPE,
+                stdout=PIPE, shell=True)
+        # written with os.write when select says there is room
+        fd = self.process.stdin.fileno()
+        fcntl.fcntl(fd, fcntl.F_SETFL,
+                    fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        Worker.running.append(self)
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.kill()
+        except OSError:
+            pass  # already dead
+        self.process.wait()
+        self.process = None
+        Worker.running.remove(self)
+
+    @classmethod
+    def stop_all(cls):
+        for worker in cls.running[:]:
+            worker.stop()
+
+    def message(self, name, pocket, actions, state):
+        request = format_request(name, pocket, actions, state)
+        last_err = None
+        # A crashed bot gets restarted once, a slow one is not retried
+        for try_no in range(2):
+            if self.process is None or self.process.poll() is not None:
+                self.stop()
+                self.start()
+            deadline = time.time() + Worker.TIMEOUT
+            try:
+                self._write(request, deadline)
+                return self._read(deadline).strip()
+            except (IOError, OSError, EOFError) as e:
+                last_err = 'bot crashed: %s' % e
+                self.stop()
+            except WorkerTimeout:
+                self.stop()
+                raise Error('bot did not answer in %s s' % Worker.TIMEOUT)
+        raise Error(last_err)
+
+    def _write(self, payload, deadline):
+        fd = self.process.stdin.fileno()
+        data = '%d\n%s' % (len(payload), payload)
+        while data:
+            remaining = deadline - time.time()
+            if (remaining <= 0 or
+                    not select.select([], [fd], [], remaining)[1]):
+                raise WorkerTimeout()
+            try:
+                data = data[os.write(fd, data):]
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+
+    def _read(self, deadline):
+        data = ''
+        while '\n' not in data:
+            data += self._receive(deadline)
+        header, _, data = data.partition('\n')
+        length = int(header)
+        while len(data) < length:
+            data += self._receive(deadline)
+        return data[:length]
+
+    def _receive(self, deadline):
+        fd = self.process.stdout.fileno()
+        remaining = deadline - time.time()
+        if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+            raise WorkerTimeout()
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            raise EOFError('end of output')
+        return chunk
+
+
+atexit.register(Worker.stop_all)
+
+
+class Python(Abstract):
+    """
+    Calls a bot function in the croupier process.
+    Service is "package.module:function", the function is called with
+    the same arguments that HTTP posts (name, pocket, actions separated
+    by newlines, state) and returns the action.
+    Calls are serialized, the bots share module state like caches.
+    """
+
+    functions = {}  # service -> imported function
+    lock = threading.Lock()
+
+    def __init__(self, service, format='xml'):
+        super(Python, self).__init__(service, format)
+        if service not in Python.functions:
+            module, _, name = service.partition(':')
+            Python.functions[service] = getattr(
+                importlib.import_module(module), name)
+        self.function = Python.functions[service]
+
+    def message(self, name, pocket, actions, state):
+        try:
+            with Python.lock:
+                return self.function(name, str(pocket), '\n'.join(actions),
+                                     state)
+        except Exception as e:
+            raise Error('%s: %s' % (e.__class__.__name__, e))
+
+
+class HTTP(Abstract):
+    """
+    Posts the request to the bot service.
+    Keep-alive connections are pooled per service URL
+    and reused by the following actions of the game.
+    A failed request is retried after a random delay
+    which doubles with every try.
+    """
+
+    TIMEOUT = 5          # seconds to wait for the response
+    CONNECT_TIMEOUT = 2
     RETRY_CNT = 3
+    BACKOFF = 0.1        # mean delay before the first retry
+    POOL_SIZE = 4        # idle connections kept per service
+
+    pools = {}  # service -> ConnectionPool
+    pools_lock = threading.Lock()
+    jitter = random.Random()  # keeps seeded games reproducible
+
+    def __init__(self, service, format='xml'):
+        super(HTTP, self).__init__(service, format)
+        with HTTP.pools_lock:
+            if service not in HTTP.pools:
+                HTTP.pools[service] = ConnectionPool(
+                    service, HTTP.POOL_SIZE, HTTP.CONNECT_TIMEOUT,
+                    HTTP.TIMEOUT)
+            self.pool = HTTP.pools[service]
 
     def message(self, name, pocket, actions, state):
         data = {
             'name':    name,
             'pocket':  str(pocket),
             'actions': '\n'.join(actions),
-            'state':   state
+            'state':   state,
+            'format':  self.format
         }
-        try_no = 1
+        body = urlencode(data)
         last_err = None
-        while try_no <= HTTP.RETRY_CNT:
+        for try_no in range(HTTP.RETRY_CNT):
+            if try_no:
+                delay = HTTP.BACKOFF * 2 ** (try_no - 1)
+                time.sleep(HTTP.jitter.uniform(0, 2 * delay))
             try:
-                response = urlopen(self.service, urlencode(data), HTTP.TIMEOUT)
-                return response.read().strip()
-            except (URLError, socket.timeout) as e:
-                last_err = str(e)
-                try_no += 1
+                return self.pool.post(body).strip()
+            except (httplib.HTTPException, socket.error) as e:
+                last_err = str(e) or e.__class__.__name__
         raise Error(last_err)
 
+    @classmethod
+    def stats(cls):
+        """
+        Latency stats of every service
+        """
+        with cls.pools_lock:
+            return dict((service, pool.stats())
+                        for service, pool in cls.pools.items())
+
+    @classmethod
+    def close_all(cls):
+        with cls.pools_lock:
+            for pool in cls.pools.values():
+                pool.close()
+            cls.pools.clear()
+
+
+atexit.register(HTTP.close_all)
+
+
+class ConnectionPool(object):
+    """
+    Keep-alive HTTP connections to one service URL
+    and the latency stats of the requests sent through them
+    """
+
+    HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+    def __init__(self, url, size, connect_timeout, read_timeout):
+        parts = urlparse.urlsplit(url)
+        if parts.scheme == 'https':
+            self.connection_class = httplib.HTTPSConnection
+        elif parts.scheme == 'http':
+            self.connection_class = httplib.HTTPConnection
+        else:
+            raise Error('not an HTTP service: %s' % url)
+        self.host = parts.netloc
+        self.path = parts.path or '/'
+        if parts.query:
+            self.path += '?' + parts.query
+        self.size = size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.idle = []
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.connects = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def post(self, body):
+        """
+        Returns the response body,
+        raises httplib.HTTPException or socket.error
+        """
+        while True:
+            try:
+                conn, reused = self._acquire()
+            except socket.error:
+                self._record(None)
+                raise
+            start = time.time()
+            try:
+                conn.request('POST', self.path, body, self.HEADERS)
+                response = conn.getresponse()
+                data = response.read()
+            except socket.timeout:
+                conn.close()
+                self._record(None)
+                raise
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if reused:
+                    # The server has closed the idle connection meanwhile.
+                    # It is not a failure of the bot, try a new one at once
+                    continue
+                self._record(None)
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            if response.status != 200:
+                self._record(None)
+                raise httplib.HTTPException(
+                    'HTTP %d %s' % (response.status, response.reason))
+            self._record(time.time() - start)
+            return data
+
+    def _acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+            self.connects += 1
+        conn = self.connection_class(self.host, timeout=self.connect_timeout)
+        conn.connect()
+        # Connect timeout is short, but the bot may think longer
+        conn.sock.settimeout(self.read_timeout)
+        return conn, False
+
+    def _release(self, conn):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def _record(self, elapsed):
+        with self.lock:
+            self.requests += 1
+            if elapsed is None:
+                self.errors += 1
+                return
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+
+    def stats(self):
+        with self.lock:
+            succeeded = self.requests - self.errors
+            return {
+                'requests':    self.requests,
+                'errors':      self.errors,
+                'connections': self.connects,
+                'mean_time':   self.total_time / succeeded if succeeded else 0.0,
+                'max_time':    self.max_time,
+            }
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
 
 class Error(Exception):
     pass
+
+
+class WorkerTimeout(Exception):
+    pass
@@ -5,5 +5,5 @@ setup(name='Poker',
       description='Poker Bot for RoboPoker competition',
       author='Martina Kollarova',
       author_email='mkollaro@gmail.com',
-      install_requires=['web.py', 'pokereval', 'xmltodict'],
+      install_requires=['web.py', 'xmltodict', 'numpy'],
       )
@@ -0,0 +1,12 @@
+import os
+import shutil
+import tempfile
+
+# the tests must not write the evaluator tables into the home directory,
+# set here so that the bot processes started by the tests use them too
+TABLES_DIR = tempfile.mkdtemp()
+os.environ['ROBOPOKER_TABLES'] = os.path.join(TABLES_DIR, 'evaluator.bin')
+
+
+def teardown():
+    shutil.rmtree(TABLES_DIR, ignore_errors=True)
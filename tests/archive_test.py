@@ -0,0 +1,160 @@
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import numpy as np
+from nose.tools import assert_almost_equal, assert_equal, assert_true
+from robopoker import archive
+from poker import analytics, simulator, tournament
+
+LINEUP = [('alice', 'simple'), ('bob', 'random'), ('carl', 'random')]
+
+
+def write_chunk(path, seed, wait, done):
+    wait.wait()
+    writer = archive.Writer(path)
+    simulator.Simulator(LINEUP, seed=seed, archive=writer).play(5)
+    writer.close()
+    if done:
+        done.set()
+
+
+def first_hand(seed):
+    path = tempfile.mkdtemp()
+    try:
+        event = threading.Event()
+        event.set()
+        write_chunk(path, seed, event, None)
+        return archive.chunks(path)[0].hand(0)
+    finally:
+        shutil.rmtree(path)
+
+
+class TestArchive(object):
+    def setup(self):
+        self.path = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.path)
+
+    def test_results_match(self):
+        writer = archive.Writer(self.path, chunk_hands=20)
+        sim = simulator.Simulator(LINEUP, stack=200, seed=5, archive=writer)
+        results = sim.play(50)
+        writer.close()
+        chunks = archive.chunks(self.path)
+        assert_equal([len(chunk) for chunk in chunks], [20, 20, 10])
+        won = dict((name, 0) for name, strategy in LINEUP)
+        for chunk in chunks:
+            net = chunk['seat.stack'] - chunk['seat.in_stack']
+            totals = np.bincount(chunk['seat.player'], weights=net)
+            for player, total in enumerate(totals):
+                won[chunk.players[player]] += int(total)
+            assert_equal(sorted(chunk.services), ['random', 'simple'])
+        for name, result in results.items():
+            assert_equal(won[name], result['won'])
+
+    def test_hand(self):
+        writer = archive.Writer(self.path)
+        simulator.Simulator(LINEUP, seed=6, archive=writer).play(5)
+        writer.close()
+        chunk, = archive.chunks(self.path)
+        for index in range(len(chunk)):
+            hand = chunk.hand(index)
+            assert_equal(len(hand['seats']), 3)
+            assert_true(len(hand['board']) in (0, 3, 4, 5))
+            assert_equal([a[2] for a in hand['actions'][:2]],
+                         ['small_blind', 'big_blind'])
+            for seat in hand['seats']:
+                assert_equal(len(seat['pocket']), 2)
+                assert_equal(seat['service'],
+                             dict(LINEUP)[seat['name']])
+            total = sum(s['stack'] - s['in_stack'] for s in hand['seats'])
+            assert_true(-3 < total <= 0)
+
+    def test_write_order(self):
+        # the process started first writes its chunk last
+        started, second_done = multiprocessing.Event(), multiprocessing.Event()
+        first = multiprocessing.Process(
+            target=write_chunk, args=(self.path, 1, second_done, None))
+        second = multiprocessing.Process(
+            target=write_chunk, args=(self.path, 2, started, second_done))
+        first.start()
+        second.start()
+        started.set()
+        first.join()
+        second.join()
+        assert_equal([chunk.hand(0) for chunk in archive.chunks(self.path)],
+                     [first_hand(2), first_hand(1)])
+
+    def test_tournament(self):
+        tournament.run(LINEUP, 30, seed=1, workers=2, batch_hands=10,
+                       archive=self.path)
+        assert_equal(sum(len(c) for c in archive.chunks(self.path)), 30)
+
+
+class TestAnalytics(object):
+    @classmethod
+    def setup_class(cls):
+        cls.path = tempfile.mkdtemp()
+        writer = archive.Writer(cls.path, chunk_hands=40)
+        sim = simulator.Simulator(LINEUP, stack=200, seed=7, archive=writer)
+        cls.results = sim.play(100)
+        writer.close()
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.path)
+
+    def test_results_match(self):
+        stats = analytics.run(self.path, workers=1)
+        for name, result in self.results.items():
+            assert_equal(stats[name]['hands'], 100)
+            assert_almost_equal(stats[name]['won'] * simulator.BIG_BLIND,
+                                result['won'])
+            assert_almost_equal(
+                analytics.bb_per_100(stats[name]['hands'], stats[name]['won'],
+                                     stats[name]['won_sq'])[0],
+                simulator.bb_per_100(result)[0])
+            for key in ('positions', 'streets'):
+                assert_equal(sum(v[0] for v in stats[name][key].values()),
+                             100)
+
+    def test_strategies(self):
+        stats = analytics.run(self.path, by='service', workers=1)
+        assert_equal(stats['random']['hands'], 200)
+        # simple bot calls everything and never raises
+        assert_true(stats['simple']['vpip'] > 0)
+        assert_equal(stats['simple']['pfr'], 0)
+        assert_equal(stats['simple']['aggressive'], 0)
+        assert_true(stats['random']['aggressive'] > 0)
+        assert_true(stats['simple']['showdown_wins'] <=
+                    stats['simple']['showdowns'])
+
+    def test_parallel(self):
+        assert_equal(analytics.run(self.path, workers=1),
+                     analytics.run(self.path, workers=2))
+
+    def test_report(self):
+        text = analytics.report(analytics.run(self.path, workers=1))
+        assert_true('bb/100 by position' in text)
+
+    def test_table_sizes(self):
+        for seats in (10, 11):
+            path = tempfile.mkdtemp()
+            try:
+                writer = archive.Writer(path)
+                lineup = [('p%d' % i, 'simple') for i in range(seats)]
+                simulator.Simulator(lineup, seed=1, archive=writer).play(seats)
+                writer.close()
+                stats = analytics.run(path, workers=1)
+            finally:
+                shutil.rmtree(path)
+            labels = analytics.position_labels(seats)
+            assert_equal(len(set(labels)), seats)
+            # the button moves every hand, so every player had every seat
+            for result in stats.values():
+                assert_equal(sorted(result['positions']), sorted(labels))
+                assert_equal([v[0] for v in result['positions'].values()],
+                             [1] * seats)
+            assert_true('UTG+%d' % (seats - 4) in analytics.report(stats))
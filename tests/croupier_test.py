@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+import xml.etree.ElementTree as ET
+from StringIO import StringIO
+from nose.tools import assert_equal, assert_true, raises
+from robopoker import transport
+from robopoker.croupier import Croupier, conduct_all
+from robopoker.entities import CARDS, Deck, Player, Table
+from robopoker.handstate.interface import HandState
+from robopoker.handstate import compact
+from robopoker.handstate.representation import dump, echo, to_public
+from poker.state import State
+
+
+class SlowCaller(transport.Abstract):
+    """Remote bot that thinks for a while and calls everything
+
+    It counts the calls in progress at once, and with `gather` set the calls
+    wait (at most a few seconds) until that many were in progress.
+    """
+
+    DELAY = 0.02
+    changed = threading.Condition()
+    active = 0
+    peak = 0
+    gather = 0
+
+    @classmethod
+    def reset(cls, gather=0):
+        cls.active = cls.peak = 0
+        cls.gather = gather
+
+    def message(self, name, pocket, actions, state):
+        cls = SlowCaller
+        with cls.changed:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+            cls.changed.notify_all()
+            deadline = time.time() + 5
+            while cls.peak < cls.gather and time.time() < deadline:
+                cls.changed.wait(deadline - time.time())
+        try:
+            time.sleep(SlowCaller.DELAY)
+        finally:
+            with cls.changed:
+                cls.active -= 1
+        if self.service == 'broken':
+            raise transport.Error('connection refused')
+        if self.service == 'buggy':
+            raise ValueError('bug')
+        return 'call' if 'call' in actions else 'check'
+
+
+def new_croupier(seed, services=('caller', 'caller', 'caller')):
+    cards = list(CARDS)
+    random.Random(seed).shuffle(cards)
+    table = Table(size=len(services))
+    for sit, service in enumerate(services):
+        table.sit_in(Player('p%d' % sit, SlowCaller(service), 200), sit)
+    return Croupier(HandState(table, Deck(cards)), StringIO())
+
+
+def result(croupier):
+    return dump(croupier.state, False)
+
+
+class TestConductAll(object):
+    def teardown(self):
+        SlowCaller.reset()
+
+    def test_same_as_conduct(self):
+        for seed in range(5):
+            single = new_croupier(seed)
+            single.conduct()
+            multi = new_croupier(seed)
+            conduct_all([multi])
+            assert_equal(result(single), result(multi))
+
+    def test_tables_concurrent(self):
+        croupiers = [new_croupier(seed) for seed in range(20)]
+        SlowCaller.reset(gather=20)
+        conduct_all(croupiers)
+        assert_equal(SlowCaller.peak, 20)
+        for croupier in croupiers:
+            assert_equal(sum(p.stack for p in croupier.state.table.players()),
+                         600)
+
+    def test_thread_per_table(self):
+        # more tables than the threads of a fixed pool would allow
+        croupiers = [new_croupier(seed) for seed in range(100)]
+        SlowCaller.reset(gather=100)
+        conduct_all(croupiers)
+        assert_equal(SlowCaller.peak, 100)
+
+    def test_threads_limit(self):
+        croupiers = [new_croupier(seed) for seed in range(4)]
+        SlowCaller.reset()
+        conduct_all(croupiers, threads=1)
+        assert_equal(SlowCaller.peak, 1)
+
+    def test_transport_error_folds(self):
+        croupier = new_croupier(1, ('caller', 'broken', 'caller'))
+        conduct_all([croupier])
+        assert_true(croupier.state.table.sits[1].folded)
+        assert_true('transport error connection refused' in
+                    croupier.log_file.getvalue())
+
+    @raises(ValueError)
+    def test_bug_raised(self):
+        conduct_all([new_croupier(1), new_croupier(2, ('caller', 'buggy'))])
+
+
+def full_public_dump(state):
+    return echo(to_public(ET.fromstring(dump(state, public=False))))
+
+
+class TestPublicDocument(object):
+    def test_same_as_full_dump(self):
+        for seed in range(3):
+            croupier = new_croupier(seed, ('caller', 'broken', 'caller'))
+            for request in croupier.play():
+                assert_equal(request.state, full_public_dump(croupier.state))
+                request.ask()
+            assert_true(croupier.state.showdown)
+            assert_equal(dump(croupier.state), full_public_dump(croupier.state))
+
+    def test_pretty(self):
+        croupier = new_croupier(0)
+        croupier.conduct()
+        pretty = dump(croupier.state, pretty=True)
+        assert_true(pretty.startswith('<?xml'))
+        assert_equal(ET.tostring(ET.fromstring(dump(croupier.state))),
+                     ET.tostring(ET.fromstring(pretty.replace('\t', '')
+                                               .replace('\n', ''))))
+
+
+class TestCompactFormat(object):
+    def test_parsed_like_xml(self):
+        croupier = new_croupier(4)
+        croupier.state.table.sits[2].transport.format = 'json'
+        turns = 0
+        for request in croupier.play():
+            hole = repr(request.player.pocket)
+            actions = ' '.join(request.actions)
+            text = compact.dump(croupier.state)
+            from_json = State(request.player.name, hole, actions, text)
+            from_xml = State(request.player.name, hole, actions,
+                             dump(croupier.state))
+            for attr in ('community', 'players', 'betting', 'pot', 'max_bet',
+                         'my_bet'):
+                assert_equal(getattr(from_json, attr), getattr(from_xml, attr))
+            if request.player.name == 'p2':
+                assert_equal(request.state, text)
+                turns += 1
+            request.ask()
+        assert_true(turns)
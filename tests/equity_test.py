@@ -0,0 +1,215 @@
+import os.path
+import threading
+import time
+import numpy
+from nose.tools import assert_almost_equal, assert_equal, assert_true
+from robopoker.evaluator import CODES
+from poker import equity, preflop
+import poker.bot
+import poker.state
+
+FILES = os.path.join("tests", "files")
+
+
+def codes(cards):
+    return [CODES[card] for card in cards.split()]
+
+
+class TestMonteCarlo(object):
+    def test_aces_heads_up(self):
+        rng = numpy.random.RandomState(1)
+        score = equity.monte_carlo(codes('AS AH'), [], 1, samples=20000,
+                                   rng=rng)
+        assert_almost_equal(score, 0.852, delta=0.015)
+
+    def test_more_opponents_lower_equity(self):
+        rng = numpy.random.RandomState(1)
+        heads_up = equity.monte_carlo(codes('KS QS'), [], 1, samples=5000,
+                                      rng=rng)
+        multiway = equity.monte_carlo(codes('KS QS'), [], 5, samples=5000,
+                                      rng=rng)
+        assert_true(multiway < heads_up)
+
+    def test_nuts_on_river(self):
+        score = equity.monte_carlo(codes('AS KS'), codes('QS JS TS 2D 3C'), 3)
+        assert_equal(score, 1.0)
+
+    def test_board_plays(self):
+        # everybody has the royal flush on the board, so everybody ties
+        score = equity.monte_carlo(codes('2D 3C'), codes('AS KS QS JS TS'), 2)
+        assert_almost_equal(score, 1 / 3.0)
+
+    def test_seeded(self):
+        first = equity.monte_carlo(codes('7D 8D'), codes('9D TC 2S'), 2,
+                                   rng=numpy.random.RandomState(5))
+        second = equity.monte_carlo(codes('7D 8D'), codes('9D TC 2S'), 2,
+                                    rng=numpy.random.RandomState(5))
+        assert_equal(first, second)
+
+
+class TestStateEquity(object):
+    def test_live_opponents(self):
+        with open(os.path.join(FILES, "flop.xml")) as f:
+            state = poker.state.State("kari", "7D AC", '', f.read())
+        assert_equal(state.opponent_count, 2)
+        assert_true(0 < state.get_equity() < state.get_hand_strength())
+
+
+class TestExact(object):
+    def test_deal_count(self):
+        assert_equal(equity.deal_count(46, 1, 1), 46 * 990)
+        assert_equal(equity.deal_count(45, 0, 2), 990 * 903)
+
+    def test_matches_sampling(self):
+        hole, community = codes('7D 8D'), codes('9D TC 2S JH')
+        score = equity.exact(hole, community)
+        sampled = equity.monte_carlo(hole, community, samples=20000,
+                                     rng=numpy.random.RandomState(2))
+        assert_almost_equal(score, sampled, delta=0.01)
+
+    def test_river_split(self):
+        score = equity.exact(codes('2D 3C'), codes('AS KS QS JS TS'))
+        assert_almost_equal(score, 0.5)
+
+    def test_calculate_falls_back_to_sampling(self):
+        hole, community = codes('7D 8D'), codes('9D TC 2S')
+        rng = numpy.random.RandomState(3)
+        first = equity.calculate(hole, community, samples=100, rng=rng,
+                                 exact_limit=1000)
+        assert_equal(first, equity.monte_carlo(
+            hole, community, samples=100, rng=numpy.random.RandomState(3)))
+        assert_equal(equity.calculate(hole, codes('9D TC 2S JH 3H'),
+                                      exact_limit=1000),
+                     equity.exact(hole, codes('9D TC 2S JH 3H')))
+
+
+class TestPreflop(object):
+    def test_hand_class(self):
+        assert_equal(preflop.hand_class(['KD', 'AS']), 'AKo')
+        assert_equal(preflop.hand_class(['7H', '8H']), '87s')
+        assert_equal(preflop.hand_class(['2C', '2D']), '22')
+        assert_equal(len(set(preflop.hand_classes())), 169)
+
+    def test_lookup(self):
+        assert_almost_equal(preflop.lookup(['AS', 'AH'], 1), 0.852,
+                            delta=0.01)
+        assert_true(preflop.lookup(['AS', 'AH'], 8) <
+                    preflop.lookup(['AS', 'AH'], 1))
+        assert_equal(preflop.lookup(['AS', 'AH'], 9), None)
+
+    def test_state_uses_table(self):
+        with open(os.path.join(FILES, "preflop.xml")) as f:
+            state = poker.state.State("kari", "7D AC", '', f.read())
+        assert_equal(state.get_equity(), preflop.lookup(['AC', '7D'],
+                                                        state.opponent_count))
+
+
+class TestEquityCache(object):
+    def test_suit_isomorphism(self):
+        key = poker.state.canonical_key(codes('AS KS'), codes('2S 7H 9D'), 2)
+        same = poker.state.canonical_key(codes('KH AH'), codes('9C 2H 7D'), 2)
+        other = poker.state.canonical_key(codes('AS KD'), codes('2S 7H 9D'),
+                                          2)
+        assert_equal(key, same)
+        assert_true(key != other)
+
+    def test_lru(self):
+        cache = poker.state.EquityCache(size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert_equal(cache.get('a'), 1)
+        cache.put('c', 3)
+        assert_equal(cache.get('b'), None)
+        assert_equal(cache.get('c'), 3)
+        assert_equal((cache.hits, cache.misses), (2, 1))
+        assert_equal(len(cache), 2)
+
+    def test_threads(self):
+        cache = poker.state.EquityCache(size=50)
+
+        def use(offset):
+            for i in range(2000):
+                cache.put((offset + i) % 80, i)
+                cache.get((offset + 3 * i) % 80)
+        threads = [threading.Thread(target=use, args=(n * 7,))
+                   for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert_equal(len(cache), 50)
+        assert_equal(cache.hits + cache.misses, 8 * 2000)
+
+    def test_threads_keep_all_samples(self):
+        with open(os.path.join(FILES, "flop.xml")) as f:
+            xml = f.read()
+        poker.state.equity_cache.clear()
+        sampled = []
+        sample = equity.sample
+
+        def counted(*args):
+            total, done = sample(*args)
+            sampled.append(done)
+            return total, done
+
+        def ask(samples):
+            for i in range(5):
+                state = poker.state.State("kari", "7D AC", '', xml)
+                state.EXACT_EQUITY_LIMIT = 0
+                state.EQUITY_SAMPLES = samples + i * 500
+                state.get_equity()
+        equity.sample = counted
+        try:
+            threads = [threading.Thread(target=ask, args=((n + 1) * 100,))
+                       for n in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            equity.sample = sample
+        (total, done), = poker.state.equity_cache._data.values()
+        assert_equal(done, sum(sampled))
+
+    def test_state_goes_through_cache(self):
+        poker.state.equity_cache.clear()
+        with open(os.path.join(FILES, "flop.xml")) as f:
+            xml = f.read()
+        first = poker.state.State("kari", "7H AC", '', xml).get_equity()
+        second = poker.state.State("kari", "7C AH", '', xml).get_equity()
+        assert_equal(first, second)
+        assert_equal(poker.state.equity_cache.hits, 1)
+
+
+class TestDeadline(object):
+    def setup(self):
+        poker.state.equity_cache.clear()
+        with open(os.path.join(FILES, "flop.xml")) as f:
+            self.xml = f.read()
+
+    def test_refines_until_deadline(self):
+        state = poker.state.State("kari", "7D AC", '', self.xml,
+                                  time.time() + 0.5)
+        state.DEADLINE_EQUITY_SAMPLES = 10 ** 9
+        assert_true(0 < state.get_equity() < 1)
+        key, = poker.state.equity_cache._data.keys()
+        # more than without the deadline, but stopped by it
+        done = poker.state.equity_cache.get(key)[1]
+        assert_true(equity.DEFAULT_SAMPLES < done < 10 ** 9)
+
+    def test_answers_after_deadline(self):
+        state = poker.state.State("kari", "7D AC", 'check call', self.xml,
+                                  time.time() - 1)
+        assert_true(0 < state.get_equity() < 1)
+        bot = poker.bot.get_bot('smart', '7D AC', 'check call', self.xml,
+                                time.time())
+        assert_true(bot.decide() in ('check', 'call'))
+
+    def test_truncated_estimate_refined(self):
+        poker.state.State("kari", "7D AC", '', self.xml,
+                          time.time() - 1).get_equity()
+        key, = poker.state.equity_cache._data.keys()
+        assert_equal(poker.state.equity_cache.get(key)[1], equity.BATCH_SIZE)
+        poker.state.State("kari", "7D AC", '', self.xml).get_equity()
+        assert_equal(poker.state.equity_cache.get(key)[1],
+                     equity.DEFAULT_SAMPLES)
@@ -0,0 +1,117 @@
+import itertools
+import os.path
+import random
+import shutil
+import tempfile
+from nose.tools import assert_equal, assert_true
+from robopoker import combinations, dictionary, evaluator
+from robopoker.entities import Card, CardSet
+
+
+def reference(hand):
+    return max(combinations.rate_hand(list(sub))
+               for sub in itertools.combinations(hand, 5))
+
+
+class TestEvaluator(object):
+    def test_fixture(self):
+        fixture = [
+            ['AS 2S 3S 4S 5S',       'sflush', [5]],
+            ['AS KS QS JS TS',       'sflush', [14]],
+            ['2S 3S 4S 5S 6S KS',    'sflush', [6]],
+            ['AS AC 3S AD AH 2H 4D', 'quad',   [14, 4]],
+            ['AS AC KS AD AH KH KD', 'quad',   [14, 13]],
+            ['3D 3C 3S AD AH',       'full',   [3, 14]],
+            ['AC 7S 6H AH 8H 2D AD', 'set',    [14, 8, 7]],
+            ['AD 2S 3S TS QS 5S',    'flush',  [12, 10, 5, 3, 2]],
+            ['AD 2S 3C 4S TS 5D',    'str',    [5]],
+            ['3D 3S AH AS 4D 4H QC', 'two',    [14, 4, 12]],
+            ['3D 3S 5H AS 4D',       'pair',   [3, 14, 5, 4]],
+            ['3D QS 5H AS 4D',       'high',   [14, 12, 5, 4, 3]],
+        ]
+        for hand, name, kickers in fixture:
+            base = dictionary.COMBINATION.index(name)
+            assert_equal(evaluator.rate_hand(hand.split()), (base, kickers))
+
+    def test_random_hands(self):
+        rnd = random.Random(42)
+        for size in (5, 6, 7):
+            for i in range(300):
+                hand = rnd.sample(evaluator.CARDS, size)
+                base, kickers = evaluator.rate_hand(hand)
+                assert_equal((base, kickers), reference(hand))
+
+    def test_score_order(self):
+        rnd = random.Random(7)
+        for i in range(300):
+            x, y = rnd.sample(evaluator.CARDS, 7), rnd.sample(evaluator.CARDS, 7)
+            score_x = evaluator.rate([evaluator.encode(c) for c in x])
+            score_y = evaluator.rate([evaluator.encode(c) for c in y])
+            assert_equal(cmp(score_x, score_y), cmp(reference(x), reference(y)))
+
+    def test_cardset_rate(self):
+        hand = CardSet([Card('K', 'S'), Card('K', 'D'), Card('9', 'D'),
+                        Card('A', 'S'), Card('2', 'S'), Card('7', 'C'),
+                        Card('7', 'H')])
+        hand.rate()
+        assert_equal(hand.base, dictionary.COMBINATION.index('two'))
+        assert_equal(hand.kickers, [13, 7, 14])
+        weaker = CardSet([Card('K', 'S'), Card('K', 'D'), Card('9', 'D'),
+                          Card('A', 'S'), Card('2', 'S'), Card('3', 'C'),
+                          Card('4', 'H')])
+        weaker.rate()
+        assert_true(weaker < hand)
+
+    def test_rate_many(self):
+        rnd = random.Random(3)
+        for size in (5, 6, 7):
+            hands = [rnd.sample(range(52), size) for i in range(500)]
+            scores = evaluator.rate_many(hands)
+            assert_equal(list(scores), [evaluator.rate(h) for h in hands])
+
+
+class TestCards(object):
+    def test_interned(self):
+        card = Card('A', 'S')
+        assert_true(card is Card('A', 'S'))
+        assert_equal(evaluator.decode(card.code), 'AS')
+        assert_equal(card.value, 14)
+
+    def test_cardset_mask(self):
+        cards = CardSet([Card('A', 'S'), Card('7', 'D')])
+        assert_true(Card('7', 'D') in cards)
+        assert_true(Card('7', 'H') not in cards)
+        assert_equal(cards.codes(), [Card('A', 'S').code, Card('7', 'D').code])
+
+
+class TestTablesFile(object):
+    @classmethod
+    def setup_class(cls):
+        cls.dir = tempfile.mkdtemp()
+        cls.flush, cls.ranked = evaluator.generate_tables()
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_round_trip(self):
+        path = os.path.join(self.dir, 'tables', 'evaluator.bin')
+        evaluator.write_tables(path, self.flush, self.ranked)
+        flush, dense, ranked_5, ranked_6 = evaluator.load_tables(path)
+        assert_equal(flush.tolist(), self.flush)
+        assert_true(not dense.flags.writeable)
+        for key, score in self.ranked[7].items():
+            assert_equal(dense[key], score)
+        for (keys, scores), size in ((ranked_5, 5), (ranked_6, 6)):
+            assert_equal(dict(zip(keys.tolist(), scores.tolist())),
+                         self.ranked[size])
+
+    def test_other_version(self):
+        path = os.path.join(self.dir, 'old.bin')
+        with open(path, 'wb') as f:
+            f.write(evaluator.TABLES_HEADER.pack(
+                evaluator.TABLES_MAGIC, evaluator.TABLES_VERSION - 1,
+                0, 0, 0, 0))
+        assert_equal(evaluator.load_tables(path), None)
+        assert_equal(evaluator.load_tables(os.path.join(self.dir, 'none')),
+                     None)
@@ -0,0 +1,82 @@
+import json
+import multiprocessing
+import os.path
+import shutil
+import tempfile
+from nose.tools import assert_equal, assert_true
+from poker.ledger import Ledger
+
+
+def add_hands(args):
+    path, player, hands = args
+    ledger = Ledger(path, compact_bytes=200)
+    for i in range(hands):
+        ledger.add({player: 1, 'house': -1})
+
+
+class TestLedger(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'stats.ledger')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_totals(self):
+        ledger = Ledger(self.path)
+        assert_equal(ledger.totals(), {})
+        ledger.add({'kari': 20, 'vbo': -20})
+        ledger.add({'kari': -10, 'lenny': 10})
+        assert_equal(ledger.totals(), {'kari': 10, 'vbo': -20, 'lenny': 10})
+        ledger.compact()
+        assert_equal(ledger.totals(), {'kari': 10, 'vbo': -20, 'lenny': 10})
+        ledger.add({'vbo': 5})
+        assert_equal(ledger.totals()['vbo'], -15)
+
+    def test_compacts(self):
+        ledger = Ledger(self.path, compact_bytes=100)
+        for i in range(20):
+            ledger.add({'kari': i})
+        offset, totals = ledger._read_snapshot()
+        assert_true(os.path.getsize(self.path) - offset <= 100 + 20)
+        assert_equal(ledger.totals(), {'kari': sum(range(20))})
+
+    def test_concurrent(self):
+        pool = multiprocessing.Pool(4)
+        try:
+            pool.map(add_hands, [(self.path, 'p%d' % i, 100)
+                                 for i in range(4)])
+        finally:
+            pool.close()
+            pool.join()
+        totals = Ledger(self.path).totals()
+        assert_equal(totals, {'p0': 100, 'p1': 100, 'p2': 100, 'p3': 100,
+                              'house': -400})
+
+    def test_crashed_writer(self):
+        ledger = Ledger(self.path)
+        ledger.add({'kari': 20})
+        with open(self.path, 'a') as f:
+            f.write('{"kari": 10')  # crashed in the middle of the line
+        assert_equal(ledger.totals(), {'kari': 20})
+        ledger.add({'kari': 5})
+        ledger.compact()
+        assert_equal(ledger.totals(), {'kari': 25})
+        with open(self.path) as f:
+            assert_equal(f.read(), '{"kari": 20}\n{"kari": 5}\n')
+
+    def test_broken_line_skipped(self):
+        with open(self.path, 'w') as f:
+            f.write('{"kari": 10{"kari": 1}\n{"vbo": 3}\n')
+        assert_equal(Ledger(self.path).totals(), {'vbo': 3})
+
+    def test_import_totals(self):
+        old = os.path.join(self.dir, 'stats.json')
+        ledger = Ledger(self.path)
+        assert_equal(ledger.import_totals(old), False)
+        with open(old, 'w') as f:
+            json.dump({'kari': 100, 'vbo': -100}, f)
+        assert_equal(ledger.import_totals(old), True)
+        ledger.add({'kari': -20, 'vbo': 20})
+        assert_equal(ledger.import_totals(old), False)
+        assert_equal(ledger.totals(), {'kari': 80, 'vbo': -80})
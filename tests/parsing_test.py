@@ -1,7 +1,8 @@
 import os.path
-from nose.tools import assert_list_equal, assert_equal
+from nose.tools import assert_list_equal, assert_equal, assert_true
 from nose.tools import raises
 from robopoker.entities import Card, CardException
+import poker.bot
 import poker.state
 
 PLAYER_NAME = "kari"
@@ -99,3 +100,34 @@ class TestStateParsing(object):
         assert_equal(len(state.community), 5)
         assert_list_equal(sorted(community_cards), sorted(state.community))
         assert_equal('river', state.round)
+
+    def test_river_players_and_betting(self):
+        state = poker.state.State(PLAYER_NAME, self.hole, '', self.river_state)
+        # lenny folded on the flop
+        assert_equal([p['name'] for p in state.players], ['vbo', 'kari'])
+        assert_equal(state.players[0], {'name': 'vbo', 'stack': 180,
+                                        'in_stack': 200})
+        assert_equal(len(state.betting['preflop']), 3)
+        assert_equal(state.betting['flop'][2],
+                     {'player': 'lenny', 'type': 'fold', 'amount': 0})
+        assert_equal(state.betting['river'], [])
+        assert_equal((state.pot, state.max_bet, state.my_bet), (40, 20, 20))
+
+
+class TestLazyParsing(object):
+    def test_not_parsed_until_needed(self):
+        bot = poker.bot.get_bot('simple', '7D AC', 'check\ncall', '<broken')
+        assert_equal(bot.decide(), 'call')
+        assert_true('_data' not in vars(bot.state))
+
+    @raises(SyntaxError)
+    def test_parsed_on_access(self):
+        state = poker.state.State(PLAYER_NAME, '7D AC', 'check', '<broken')
+        state.community
+
+    def test_loaded_fields(self):
+        with open(os.path.join(FILES, "flop.xml")) as f:
+            state = poker.state.State(PLAYER_NAME, '7D AC', '', f.read())
+        assert_equal(state.round, 'flop')
+        assert_true('community' in vars(state))
+        assert_true('players' not in vars(state))
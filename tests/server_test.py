@@ -0,0 +1,138 @@
+import httplib
+import json
+import os.path
+import threading
+import time
+import urllib
+import urllib2
+from nose.tools import assert_equal, assert_true
+from robopoker import transport
+from poker import bot, server
+
+FILES = os.path.join("tests", "files")
+
+
+class SleepyBot(bot.SimpleBot):
+    name = 'sleepy'
+
+    def get_decision_probabilities(self):
+        time.sleep(5)
+        return [0.0, 1.0, 0.0]
+
+
+class SlowBot(bot.SimpleBot):
+    name = 'slow'
+
+    def get_decision_probabilities(self):
+        # thinks for 0.15 s, but answers before the deadline
+        time.sleep(max(min(0.15, self.state.deadline - time.time() - 0.02),
+                       0))
+        return [0.0, 1.0, 0.0]
+
+
+class TestServer(object):
+    @classmethod
+    def setup_class(cls):
+        with open(os.path.join(FILES, "flop.xml")) as f:
+            cls.state = f.read()
+        # the workers get it when they are forked
+        bot.BOTS['sleepy'] = SleepyBot
+        cls.server = server.Server(('127.0.0.1', 0), workers=2,
+                                   deadline=0.2)
+        cls.server.start()
+        supervisor = threading.Thread(target=cls.server.supervise)
+        supervisor.daemon = True
+        supervisor.start()
+        cls.url = 'http://127.0.0.1:%d/' % cls.server.address[1]
+
+    @classmethod
+    def teardown_class(cls):
+        transport.HTTP.close_all()
+        cls.server.stop()
+        del bot.BOTS['sleepy']
+
+    def stats(self):
+        return json.load(urllib2.urlopen(self.url + 'stats'))
+
+    def test_decides(self):
+        tr = transport.create('http', self.url)
+        for i in range(3):
+            assert_equal(tr.message('simple', '7D AC', ['check', 'bet'],
+                                    self.state), 'check')
+
+    def test_deadline(self):
+        deadlines = self.stats()['deadlines']
+        tr = transport.create('http', self.url)
+        assert_equal(tr.message('sleepy', '7D AC', ['call', 'raise', 'fold'],
+                                self.state), 'fold')
+        assert_equal(self.stats()['deadlines'], deadlines + 1)
+
+    def test_interrupted_worker_replaced(self):
+        pids = set(self.server.pids)
+        tr = transport.create('http', self.url)
+        assert_equal(tr.message('sleepy', '7D AC', ['check'], self.state),
+                     'check')
+        for i in range(50):
+            if set(self.server.pids) != pids:
+                break
+            time.sleep(0.02)
+        assert_equal(len(set(self.server.pids) - pids), 1)
+        assert_equal(len(self.server.pids), 2)
+        for i in range(4):
+            assert_equal(tr.message('simple', '7D AC', ['check'], self.state),
+                         'check')
+
+    def test_anytime(self):
+        deadlines = self.stats()['deadlines']
+        tr = transport.create('http', self.url)
+        # the smart bot samples equity until shortly before the deadline,
+        # so it is not interrupted
+        tr.message('smart', '7D AC', ['call', 'raise', 'fold'], self.state)
+        assert_equal(self.stats()['deadlines'], deadlines)
+
+    def test_error(self):
+        tr = transport.create('http', self.url)
+        assert_true(tr.message('simple', '7D', ['check'], self.state)
+                    .startswith('error: '))
+
+    def test_stats(self):
+        requests = self.stats()['requests']
+        tr = transport.create('http', self.url)
+        tr.message('simple', '7D AC', ['check'], self.state)
+        stats = self.stats()
+        assert_equal(stats['requests'], requests + 1)
+        assert_equal(len(stats['histogram']), len(server.BUCKETS) + 1)
+        assert_equal(sum(stats['histogram']), stats['requests'])
+
+
+class TestBacklog(object):
+    @classmethod
+    def setup_class(cls):
+        with open(os.path.join(FILES, "flop.xml")) as f:
+            cls.state = f.read()
+        bot.BOTS['slow'] = SlowBot
+        cls.server = server.Server(('127.0.0.1', 0), workers=1,
+                                   deadline=0.5)
+        cls.server.start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+        del bot.BOTS['slow']
+
+    def test_queued_requests_answered_in_time(self):
+        connections = [httplib.HTTPConnection(*self.server.address)
+                       for i in range(8)]
+        for connection in connections:
+            connection.connect()
+        time.sleep(0.1)  # the worker accepts them all
+        body = urllib.urlencode({'name': 'slow', 'pocket': '7D AC',
+                                 'actions': 'check', 'state': self.state})
+        start = time.time()
+        for connection in connections:
+            connection.request('POST', '/', body)
+        for connection in connections:
+            assert_equal(connection.getresponse().read(), 'check')
+            # without the backlog cap the last would come after 1.2 s
+            assert_true(time.time() - start < 0.8)
+            connection.close()
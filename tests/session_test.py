@@ -0,0 +1,75 @@
+import os.path
+import threading
+import time
+from nose.tools import assert_equal, assert_true
+from poker.session import SessionCache, session_key
+import poker.state
+
+FILES = os.path.join("tests", "files")
+PLAYERS = [{'name': 'vbo', 'in_stack': 200}, {'name': 'kari', 'in_stack': 200}]
+
+
+class TestSessionCache(object):
+    def test_same_hand(self):
+        cache = SessionCache()
+        first = cache.get(session_key('kari', ['7D', 'AC'], PLAYERS))
+        second = cache.get(session_key('kari', ['AC', '7D'], PLAYERS))
+        assert_true(first is second)
+        assert_equal(first.requests, 2)
+        other = PLAYERS[:1] + [{'name': 'kari', 'in_stack': 180}]
+        assert_true(cache.get(session_key('kari', ['7D', 'AC'], other))
+                    is not first)
+        assert_equal((cache.hits, cache.misses), (1, 2))
+
+    def test_bounded(self):
+        cache = SessionCache(size=2)
+        first = cache.get('a')
+        cache.get('b')
+        cache.get('c')
+        assert_equal(len(cache), 2)
+        assert_true(cache.get('a') is not first)
+
+    def test_expires(self):
+        cache = SessionCache(ttl=0.05)
+        first = cache.get('a')
+        assert_true(cache.get('a') is first)
+        time.sleep(0.1)
+        cache.get('b')
+        assert_equal(len(cache), 1)
+        assert_true(cache.get('a') is not first)
+
+    def test_threads(self):
+        cache = SessionCache(size=50, ttl=0.01)
+
+        def use(offset):
+            for i in range(2000):
+                cache.get((offset + i) % 80)
+        threads = [threading.Thread(target=use, args=(n * 7,))
+                   for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert_true(len(cache) <= 50)
+        assert_equal(cache.hits + cache.misses, 8 * 2000)
+
+
+class TestStateSession(object):
+    def setup(self):
+        poker.state.equity_cache.clear()
+        with open(os.path.join(FILES, "flop.xml")) as f:
+            self.xml = f.read()
+
+    def test_same_hand(self):
+        cache = SessionCache()
+        first = poker.state.State("kari", "7D AC", '', self.xml,
+                                  sessions=cache)
+        second = poker.state.State("kari", "AC 7D", 'call', self.xml,
+                                   sessions=cache)
+        assert_true(second.session is first.session)
+        assert_equal(first.session.requests, 2)
+
+    def test_without_sessions(self):
+        state = poker.state.State("kari", "7D AC", '', self.xml)
+        assert_equal(state.session, None)
+        assert_true(0 < state.get_equity() < 1)
@@ -0,0 +1,58 @@
+from nose.tools import assert_equal, assert_true
+from poker import simulator, tournament
+
+LINEUP = [('alice', 'simple'), ('bob', 'random'), ('carl', 'random'),
+          ('dave', 'simple')]
+
+
+class TestSimulator(object):
+    def test_seeded(self):
+        first = simulator.Simulator(LINEUP, seed=3).play(200)
+        second = simulator.Simulator(LINEUP, seed=3).play(200)
+        assert_equal(first, second)
+
+    def test_results(self):
+        sim = simulator.Simulator(LINEUP, stack=200, seed=4)
+        results = sim.play(300)
+        assert_equal(sim.hands, 300)
+        assert_equal(set(results), set(name for name, strategy in LINEUP))
+        for result in results.values():
+            assert_equal(result['hands'], 300)
+        # split pots may lose a chip to rounding, but nothing is created
+        total = sum(result['won'] for result in results.values())
+        assert_true(-300 < total <= 0)
+        assert_true(sum(result['rebuys'] for result in results.values()) > 0)
+
+    def test_equity_deals(self):
+        lineup = [('alice', 'smart'), ('bob', 'threshold')]
+        first = simulator.Simulator(lineup, seed=5, equity_deals=100).play(20)
+        second = simulator.Simulator(lineup, seed=5,
+                                     equity_deals=100).play(20)
+        assert_equal(first, second)
+        assert_equal(first['alice']['hands'], 20)
+
+    def test_rotate_button(self):
+        sim = simulator.Simulator(LINEUP)
+        buttons = []
+        for i in range(5):
+            sim.rotate_button()
+            buttons.append(sim.table.button)
+        assert_equal(buttons, [1, 2, 3, 0, 1])
+
+    def test_parse_lineup(self):
+        assert_equal(simulator.parse_lineup(['kari:smart', 'simple']),
+                     [('kari', 'smart'), ('simple1', 'simple')])
+
+
+class TestTournament(object):
+    def test_independent_of_workers(self):
+        single = tournament.run(LINEUP, 250, seed=9, workers=1,
+                                batch_hands=100)
+        pooled = tournament.run(LINEUP, 250, seed=9, workers=2,
+                                batch_hands=100)
+        assert_equal(single, pooled)
+        assert_equal(single['alice']['hands'], 250)
+
+    def test_batch_seed(self):
+        assert_equal(tournament.batch_seed(1, 2), tournament.batch_seed(1, 2))
+        assert_true(tournament.batch_seed(1, 2) != tournament.batch_seed(1, 3))
@@ -0,0 +1,237 @@
+import BaseHTTPServer
+import SocketServer
+import os.path
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from nose.tools import assert_equal, assert_true, raises
+from robopoker import transport
+from poker import worker
+
+FILES = os.path.join("tests", "files")
+
+
+class TestPython(object):
+    def test_calls_bot(self):
+        with open(os.path.join(FILES, "flop.xml")) as f:
+            state = f.read()
+        tr = transport.create('python', 'poker.bot:decide')
+        assert_equal(tr.type(), 'python')
+        assert_equal(tr.message('simple', '7D AC', ['check', 'bet', 'fold'],
+                                state), 'check')
+
+    def test_imported_once(self):
+        first = transport.create('python', 'poker.bot:decide')
+        second = transport.create('python', 'poker.bot:decide')
+        assert_equal(first.function, second.function)
+
+    @raises(transport.Error)
+    def test_bot_error(self):
+        tr = transport.create('python', 'poker.bot:decide')
+        tr.message('simple', '7D', ['check'], '')
+
+
+class TestCreate(object):
+    def test_format(self):
+        tr = transport.create('python+json', 'poker.bot:decide')
+        assert_equal(tr.format, 'json')
+        assert_equal(tr.type(), 'python+json')
+        assert_equal(transport.create('python', 'poker.bot:decide').format,
+                     'xml')
+
+    @raises(transport.Error)
+    def test_unknown_format(self):
+        transport.create('python+yaml', 'poker.bot:decide')
+
+
+class TestWorker(object):
+    service = '%s -m poker.worker' % sys.executable
+
+    @classmethod
+    def setup_class(cls):
+        with open(os.path.join(FILES, "flop.xml")) as f:
+            cls.state = f.read()
+
+    def teardown(self):
+        transport.Worker.stop_all()
+
+    def test_keeps_process(self):
+        tr = transport.create('worker', self.service)
+        actions = ['check', 'bet', 'fold']
+        assert_equal(tr.message('simple', '7D AC', actions, self.state),
+                     'check')
+        pid = tr.process.pid
+        assert_equal(tr.message('simple', '7D AC', actions, self.state),
+                     'check')
+        assert_equal(tr.process.pid, pid)
+
+    def test_restarts_crashed(self):
+        tr = transport.create('worker', self.service)
+        tr.message('simple', '7D AC', ['check'], self.state)
+        tr.process.kill()
+        tr.process.wait()
+        assert_equal(tr.message('simple', '7D AC', ['check'], self.state),
+                     'check')
+
+    def test_timeout(self):
+        tr = transport.create(
+            'worker', '%s -c "import time; time.sleep(60)"' % sys.executable)
+        timeout = transport.Worker.TIMEOUT
+        transport.Worker.TIMEOUT = 0.5
+        try:
+            tr.message('simple', '7D AC', ['check'], self.state)
+            assert_true(False, 'no timeout')
+        except transport.Error:
+            assert_equal(tr.process, None)
+        finally:
+            transport.Worker.TIMEOUT = timeout
+
+    def test_write_timeout(self):
+        # the bot does not read, the request does not fit in the pipe
+        tr = transport.create(
+            'worker', '%s -c "import time; time.sleep(60)"' % sys.executable)
+        timeout = transport.Worker.TIMEOUT
+        transport.Worker.TIMEOUT = 0.5
+        start = time.time()
+        try:
+            tr.message('simple', '7D AC', ['check'], 'x' * 1000000)
+            assert_true(False, 'no timeout')
+        except transport.Error:
+            assert_equal(tr.process, None)
+            assert_true(time.time() - start < 2)
+        finally:
+            transport.Worker.TIMEOUT = timeout
+
+    def test_parse_request(self):
+        request = transport.format_request('kari', '7D AC', ['call', 'fold'],
+                                           '<game>\n</game>')
+        assert_equal(worker.parse_request(request),
+                     ('kari', '7D AC', 'call\nfold', '<game>\n</game>'))
+        request = transport.format_request('kari', '7D AC', [], '')
+        assert_equal(worker.parse_request(request), ('kari', '7D AC', '', ''))
+
+
+class TestCLI(object):
+    service = '%s -m poker.cli' % sys.executable
+
+    @classmethod
+    def setup_class(cls):
+        with open(os.path.join(FILES, "flop.xml")) as f:
+            cls.state = f.read()
+        cls.dir = tempfile.mkdtemp()
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_decides(self):
+        tr = transport.create('local', self.service)
+        assert_equal(tr.message('simple', '7D AC', ['check', 'bet', 'fold'],
+                                self.state), 'check')
+
+    def test_strategy_and_timings(self):
+        path = os.path.join(self.dir, 'timings')
+        tr = transport.create('local', '%s -s simple -t %s' % (self.service,
+                                                                path))
+        assert_equal(tr.message('smart', '7D AC', ['check', 'bet', 'fold'],
+                                self.state), 'check')
+        with open(path) as f:
+            assert_true(f.read().startswith('import '))
+
+    def test_error(self):
+        tr = transport.create('local', self.service)
+        assert_true(tr.message('simple', '7D', ['check'], self.state)
+                    .startswith('error: '))
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Bot service answering 'check', failing the first `failures` posts"""
+
+    daemon_threads = True
+
+    def __init__(self, failures=0):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           StandInHandler)
+        self.failures = failures
+        self.connections = 0
+        self.posts = []
+        self.url = 'http://127.0.0.1:%d/bot' % self.server_address[1]
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        self.server.posts.append(self.rfile.read(length))
+        if self.server.failures:
+            self.server.failures -= 1
+            status, body = 500, 'error'
+        else:
+            status, body = 200, 'check\n'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTP(object):
+    def setup(self):
+        self.backoff = transport.HTTP.BACKOFF
+        transport.HTTP.BACKOFF = 0.01
+
+    def teardown(self):
+        transport.HTTP.BACKOFF = self.backoff
+        transport.HTTP.close_all()
+
+    def test_keep_alive(self):
+        server = StandInServer()
+        try:
+            for i in range(3):
+                tr = transport.create('http', server.url)
+                assert_equal(tr.message('kari', '7D AC', ['check', 'fold'],
+                                        '<game/>'), 'check')
+            assert_equal(server.connections, 1)
+            assert_equal(len(server.posts), 3)
+            assert_true('actions=check%0Afold' in server.posts[0])
+            stats = transport.HTTP.stats()[server.url]
+            assert_equal(stats['requests'], 3)
+            assert_equal(stats['errors'], 0)
+            assert_equal(stats['connections'], 1)
+            assert_true(0 < stats['mean_time'] <= stats['max_time'])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_retry(self):
+        server = StandInServer(failures=2)
+        try:
+            tr = transport.create('http', server.url)
+            assert_equal(tr.message('kari', '7D AC', ['check'], ''), 'check')
+            stats = transport.HTTP.stats()[server.url]
+            assert_equal(stats['requests'], 3)
+            assert_equal(stats['errors'], 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @raises(transport.Error)
+    def test_unreachable(self):
+        server = StandInServer()
+        url = server.url
+        server.shutdown()
+        server.server_close()
+        transport.create('http', url).message('kari', '7D AC', ['check'], '')
@@ -1,11 +1,18 @@
 import web
 import poker
+import poker.logs
+import poker.session
+from poker.server import DEADLINE, MIN_DECISION, fallback
 import os
 import logging
+import time
 
 LOG_DIR = os.environ.get('OPENSHIFT_PYTHON_LOG_DIR', './').strip()
 LOG_FILE = os.path.join(LOG_DIR, 'pokerbot.log')
 LOG = logging.getLogger("bot")
+# the front proxy's time of receiving the request, e.g. "t=1445372400.123"
+# or in micro- or milliseconds, the deadline runs from it
+REQUEST_START = 'HTTP_X_REQUEST_START'
 poker.logs.set_logging_options(color=False, filename=LOG_FILE)
 
 urls = (
@@ -15,15 +22,32 @@ urls = (
 app = web.application(urls, globals())
 
 
+def received(environ):
+    """Return the time.time() by which the request arrived"""
+    now = time.time()
+    try:
+        start = float(environ[REQUEST_START].strip().lstrip('t='))
+    except (KeyError, ValueError):
+        return now
+    while start > now * 100:
+        start /= 1000
+    return min(start, now)
+
+
 class index:
     def GET(self):
         return self.POST()
 
     def POST(self):
         form = web.input(name="", pocket="", actions="", state="")
+        deadline = received(web.ctx.environ) + DEADLINE
+        if deadline - time.time() < MIN_DECISION:
+            LOG.warning('request waited too long, no time to decide')
+            return fallback(form.actions.split())
         try:
             bot = poker.get_bot(form.name, form.pocket,
-                                form.actions, form.state)
+                                form.actions, form.state, deadline,
+                                poker.session.sessions)
             return bot.decide()
         except Exception, e:
             LOG.exception(e)